@@ -0,0 +1,93 @@
+/*
+ * Clientside callbacks for the MetOncoFit explorer
+ */
+(function() {
+    var directions = ['up', 'neut', 'down'];
+
+    // Same as metoncofit.figures.placeholder
+    var placeholder = {
+        data: [],
+        layout: {autosize: false, xaxis: {visible: false}, yaxis: {visible: false}}
+    };
+
+    /*
+     * Cut the heatmap for the first n genes out of a stored view. The view
+     * holds the figure for every gene, the rank of each column's gene and the
+     * display position of each cell (-1 where empty). Columns are already in
+     * display order, so the slice keeps the columns ranked below n; rows are
+     * the features with a cell in any of them, ordered by their first cell.
+     * Given a gene, only that gene's column is kept instead.
+     */
+    function slice(view, n, gene) {
+        var trace = view.figure.data[0];
+        var cols = [];
+        for (var j = 0; j < view.rank.length; j++) {
+            if (gene ? trace.x[j].toLowerCase() === gene : view.rank[j] < n) {
+                cols.push(j);
+            }
+        }
+        if (!cols.length) {
+            return placeholder;
+        }
+
+        var rows = [];
+        for (var i = 0; i < trace.y.length; i++) {
+            var first = -1;
+            for (var k = 0; k < cols.length; k++) {
+                var p = view.position[i][cols[k]];
+                if (p >= 0 && (first < 0 || p < first)) {
+                    first = p;
+                }
+            }
+            if (first >= 0) {
+                rows.push({row: i, first: first});
+            }
+        }
+        rows.sort(function(a, b) { return a.first - b.first; });
+
+        var pick = function(row) {
+            return cols.map(function(j) { return row[j]; });
+        };
+        return {
+            data: [Object.assign({}, trace, {
+                x: pick(trace.x),
+                y: rows.map(function(r) { return trace.y[r.row]; }),
+                z: rows.map(function(r) { return pick(trace.z[r.row]); }),
+                customdata: rows.map(function(r) { return pick(trace.customdata[r.row]); })
+            })],
+            layout: view.figure.layout
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        metoncofit: {
+            // Label under the gene slider, updated without a server round trip
+            gene_count: function(value) {
+                return 'Number of genes displayed: ' + value;
+            },
+
+            // Export links for the selected view and number of genes
+            export_links: function(cancer, target, n) {
+                var query = '/export?cancer=' + encodeURIComponent(cancer || '') +
+                    '&target=' + encodeURIComponent(target || '') + '&genes=' + n;
+                return [query + '&format=csv', query + '&format=parquet'];
+            },
+
+            // The three heatmaps for the 'client' slider mode. A search for a
+            // gene in the stored views, once submitted, shows just that gene.
+            heatmaps: function(n, views, submitted, blurred, search) {
+                if (!views) {
+                    return directions.map(function() { return placeholder; });
+                }
+                var gene = (search || '').trim().toLowerCase();
+                var found = gene && directions.some(function(nam) {
+                    return views[nam] && views[nam].figure.data[0].x.some(
+                        function(x) { return x.toLowerCase() === gene; });
+                });
+                return directions.map(function(nam) {
+                    return views[nam] ? slice(views[nam], n, found ? gene : '') : placeholder;
+                });
+            }
+        }
+    });
+})();
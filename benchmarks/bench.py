@@ -0,0 +1,218 @@
+"""
+Benchmarks for the MetOncoFit explorer
+
+Generates a synthetic db.json at the requested scale, then measures the cold start time of run_app, the latency of every server-side heatmap callback across a sweep of gene-slider values (with the figure cache cleared and warm), the size of the serialized responses, and the throughput of concurrent callback requests against the Flask test client. Results are written as JSON so they can be compared between commits.
+
+    python benchmarks/bench.py --genes 2000 --features 10 --cancers 11 --targets 3 -o bench.json
+@author: Scott Campit
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CANCERS = ['Pan Cancer', 'Breast', 'CNS', 'Colon', 'Complex', 'Leukemia',
+           'Lung', 'Melanoma', 'Ovarian', 'Prostate', 'Renal']
+TARGETS = [('Differential Expression', ['UPREGULATED', 'NEUTRAL', 'DOWNREGULATED']),
+           ('Copy Number Variation', ['GAIN', 'NEUT', 'LOSS']),
+           ('Patient Survival', ['UPREGULATED', 'NEUTRAL', 'DOWNREGULATED'])]
+
+
+def synthetic(path, genes, features, cancers, targets, seed=0):
+    """
+    Write a db.json with every gene scored on every feature for each cancer and target, and return its number of rows.
+    """
+    rng = np.random.RandomState(seed)
+    frames = []
+    for cancer in CANCERS[:cancers]:
+        for target, types in TARGETS[:targets]:
+            gini = rng.rand(features)
+            label = rng.randint(len(types), size=genes)
+            frames.append(pd.DataFrame({
+                'Gene': np.repeat(['G{:05d}'.format(i) for i in range(genes)], features),
+                'Feature': np.tile(['Feature {}'.format(i) for i in range(features)], genes),
+                'Value': rng.rand(genes * features),
+                'R': rng.uniform(-1, 1, genes * features),
+                'Gini': np.tile(gini, genes),
+                'Cancer': cancer,
+                'Target': target,
+                'Type': np.repeat(np.array(types)[label], features)
+                }))
+    data = pd.concat(frames, ignore_index=True)
+    data.to_json(path)
+    return len(data)
+
+
+def environment(db):
+    env = dict(os.environ)
+    env['METONCOFIT_DATA'] = db
+    env['PYTHONPATH'] = os.pathsep.join([ROOT, env.get('PYTHONPATH', '')])
+    return env
+
+
+def cold_start(db, runs):
+    """
+    Seconds to import run_app in a fresh interpreter.
+    """
+    script = 'import time; t = time.time(); import run_app; print(time.time() - t)'
+    times = []
+    for _ in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', script],
+                                      env=environment(db), cwd=ROOT)
+        times.append(float(out.decode().strip().splitlines()[-1]))
+    return summary(times)
+
+
+def summary(values):
+    values = np.asarray(values, dtype=float)
+    return {'n': len(values),
+            'mean': float(values.mean()),
+            'p50': float(np.percentile(values, 50)),
+            'p99': float(np.percentile(values, 99)),
+            'max': float(values.max())}
+
+
+def requests_for(app, slider):
+    """
+    Request bodies for every server-side callback at the given slider value, for each (cancer, target) view.
+    """
+    values = {'gene-slider': slider}
+    bodies = []
+    for cancer, target in sorted(app.datasets.current.partitions):
+        values.update({'cancer-type': cancer, 'prediction-type': target})
+        for output, callback in app.app.callback_map.items():
+            if 'callback' not in callback:
+                continue
+            body = {'output': output}
+            for arg in ('inputs', 'state'):
+                body[arg] = [{'id': i['id'], 'property': i['property'],
+                              'value': values.get(i['id'])}
+                             for i in callback.get(arg, [])]
+            bodies.append((output, body))
+    return bodies
+
+
+def latency(app, sliders, repeats):
+    """
+    Latency and response size of each callback per slider value, with the figure cache cleared before every request (cold) and after it is filled (warm).
+    """
+    client = app.app.server.test_client()
+    results = {}
+    for slider in sliders:
+        bodies = requests_for(app, slider)
+        for output in sorted(set(o for o, _ in bodies)):
+            cold, warm, size = [], [], []
+            for _ in range(repeats):
+                for o, body in bodies:
+                    if o != output:
+                        continue
+                    app.figure_cache.clear()
+                    start = time.time()
+                    response = client.post('/_dash-update-component', json=body)
+                    cold.append(time.time() - start)
+                    size.append(len(response.data))
+                    start = time.time()
+                    client.post('/_dash-update-component', json=body)
+                    warm.append(time.time() - start)
+            results.setdefault(output, {})[str(slider)] = {
+                'cold': summary(cold), 'warm': summary(warm),
+                'bytes': summary(size)}
+    return results
+
+
+def throughput(app, sliders, threads, seconds):
+    """
+    Requests per second served by concurrent clients sending random callback requests.
+    """
+    bodies = [body for slider in sliders for _, body in requests_for(app, slider)]
+    deadline = time.time() + seconds
+    counts = [0] * threads
+    times = [[] for _ in range(threads)]
+
+    def worker(i):
+        client = app.app.server.test_client()
+        rng = random.Random(i)
+        while time.time() < deadline:
+            start = time.time()
+            client.post('/_dash-update-component', json=rng.choice(bodies))
+            times[i].append(time.time() - start)
+            counts[i] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return {'threads': threads, 'seconds': seconds,
+            'requests_per_second': sum(counts) / float(seconds),
+            'latency': summary([t for ts in times for t in ts])}
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--genes', type=int, default=500)
+    parser.add_argument('--features', type=int, default=10)
+    parser.add_argument('--cancers', type=int, default=3)
+    parser.add_argument('--targets', type=int, default=3)
+    parser.add_argument('--sliders', type=int, nargs='+', default=[10, 25, 100, 500])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--starts', type=int, default=3,
+                        help='cold starts to time')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('-o', '--output', help='JSON file to write (default stdout)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='metoncofit-bench-')
+    db = os.path.join(workdir, 'db.json')
+    rows = synthetic(db, args.genes, args.features, args.cancers, args.targets)
+
+    result = {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'scale': {'genes': args.genes, 'features': args.features,
+                  'cancers': args.cancers, 'targets': args.targets,
+                  'rows': rows},
+        'cold_start_seconds': cold_start(db, args.starts)
+        }
+
+    os.environ.update(environment(db))
+    sys.path.insert(0, ROOT)
+    import run_app
+    result['startup_seconds'] = {
+        dict(key)['stage']: value for key, value in
+        run_app.metoncofit.metrics.STARTUP.samples().items()}
+    result['callbacks'] = latency(run_app, args.sliders, args.repeats)
+    result['throughput'] = throughput(run_app, args.sliders, args.threads,
+                                      args.seconds)
+
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
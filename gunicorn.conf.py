@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for the MetOncoFit explorer
+
+    gunicorn -c gunicorn.conf.py run_app:server
+
+Values come from metoncofit.config, so they can be overridden with METONCOFIT_* environment variables.
+@author: Scott Campit
+"""
+
+import metoncofit.config
+
+bind = '{}:{}'.format(metoncofit.config.HOST, metoncofit.config.PORT)
+workers = metoncofit.config.WORKERS
+threads = metoncofit.config.THREADS
+worker_class = 'gthread'
+timeout = metoncofit.config.TIMEOUT
+
+# Load db.json, build the indexes and warm the figure cache once in the
+# master, then fork the workers so they share those pages
+preload_app = True
+
+# Recycle workers now and then to bound memory growth
+max_requests = 1000
+max_requests_jitter = 100
+
+
+def post_fork(server, worker):
+    # Watch db.json and the reload marker from the start, rather than from
+    # the first request each worker happens to get
+    import run_app
+    run_app.datasets.ensure_watching()
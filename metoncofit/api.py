@@ -0,0 +1,228 @@
+"""
+MetOncoFit Interactive explorer query API
+
+JSON API served next to the Dash app, for pipelines that need the values behind the heatmaps.
+
+GET /api/v1/views
+    The (cancer, target) views, with the target label and number of genes of each of their heatmaps.
+
+GET /api/v1/rows
+    A page of rows of the table, as {"rows": [...], "next": cursor}. Parameters:
+        gene            a gene; repeat it, or separate genes with commas, for several
+        cancer, target  the view to query; both are required unless genes are given
+        type            Type labels (UPREGULATED, GAIN, ...) or heatmaps (up, neut, down)
+        feature         features
+        limit           rows per page, at most MAX_LIMIT (DEFAULT_LIMIT by default)
+        cursor          the "next" of the previous page
+    type and feature can be repeated like gene. Rows are in gene order, and "next" is null on the last page. A cursor is only valid for the version of the data it was issued for.
+
+POST /api/v1/batch
+    {"queries": [{"cancer": ..., "target": ..., "gene": [...], ...}, ...]}, with the parameters of /rows (as strings, lists of strings for gene, type and feature, or a number for limit), up to MAX_BATCH queries. Answers {"results": [...]} with a page, or {"error": message}, for each query in order.
+
+Queries start from the rows grouped by gene or by view in metoncofit.data.GeneRows, so they cost time in the rows of the requested genes or view, never a scan of the table.
+@author: Scott Campit
+"""
+
+import base64
+import binascii
+
+import flask
+import numpy as np
+
+import metoncofit.cache
+import metoncofit.data
+import metoncofit.metrics
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+MAX_BATCH = 100
+
+# Candidate rows filtered at a time while filling a page
+SCAN_ROWS = 50000
+
+
+class QueryError(ValueError):
+    """
+    A query the API can't answer, reported to the client with status 400.
+    """
+
+
+def _string(value, param):
+    """
+    value, checked to be a string (or None) since batch queries come from arbitrary JSON.
+    """
+    if value is not None and not isinstance(value, str):
+        raise QueryError('{} must be a string'.format(param))
+    return value
+
+
+def _names(values, param):
+    if values is None:
+        return []
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    names = []
+    for value in values:
+        if not isinstance(value, str):
+            raise QueryError('{} must be a string or a list of strings'.format(param))
+        names.extend(name.strip() for name in value.split(',') if name.strip())
+    return names
+
+
+def _types(values):
+    types = []
+    for name in _names(values, 'type'):
+        types.extend(metoncofit.data.DIRECTIONS.get(name, [name]))
+    return types
+
+
+def encode_cursor(version, position):
+    token = '{}:{}'.format(version, position).encode('utf-8')
+    return base64.urlsafe_b64encode(token).decode('ascii')
+
+
+def decode_cursor(cursor, version):
+    """
+    Position the page after cursor starts from, checking the cursor was issued for this version of the data.
+    """
+    if not cursor:
+        return 0
+    try:
+        issued, position = base64.urlsafe_b64decode(
+            cursor.encode('ascii')).decode('utf-8').rsplit(':', 1)
+        position = int(position)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise QueryError('invalid cursor')
+    if issued != version:
+        raise QueryError('the cursor is from another version of the data; '
+                         'start again without it')
+    return position
+
+
+def records(gene_rows, positions):
+    """
+    The rows at positions as a list of {column: value} dicts.
+    """
+    frame = gene_rows.frame(positions)
+    columns = [frame[col].values for col in metoncofit.data.COLUMNS]
+    return [dict(zip(metoncofit.data.COLUMNS, row)) for row in zip(*columns)]
+
+
+def query(gene_rows, version, gene=None, cancer=None, target=None, type=None,
+          feature=None, limit=None, cursor=None):
+    """
+    One page of rows for the parameters of /api/v1/rows.
+    """
+    genes = _names(gene, 'gene')
+    cancer = _string(cancer, 'cancer')
+    target = _string(target, 'target')
+    cursor = _string(cursor, 'cursor')
+    if limit is not None and (isinstance(limit, bool)
+                              or not isinstance(limit, (int, str))):
+        raise QueryError('limit must be a number')
+    if genes:
+        candidates = gene_rows.genes(genes)
+    elif cancer and target:
+        candidates = gene_rows.view(cancer, target)
+    else:
+        raise QueryError('give gene, or cancer and target')
+
+    try:
+        limit = DEFAULT_LIMIT if limit in (None, '') else int(limit)
+    except (TypeError, ValueError):
+        raise QueryError('limit must be a number')
+    if not 0 < limit <= MAX_LIMIT:
+        raise QueryError('limit must be between 1 and {}'.format(MAX_LIMIT))
+
+    filters = {'Cancer': [cancer] if cancer else None,
+               'Target': [target] if target else None,
+               'Type': _types(type) or None,
+               'Feature': _names(feature, 'feature') or None}
+
+    # Candidates are in increasing position, so the page after a cursor
+    # starts with a binary search, and only as many candidates as it takes to
+    # fill the page (plus one row, to know if there is a next page) are read
+    start = np.searchsorted(candidates, decode_cursor(cursor, version))
+    found = []
+    count = 0
+    for i in range(start, len(candidates), SCAN_ROWS):
+        rows = gene_rows.where(candidates[i:i + SCAN_ROWS], **filters)
+        found.append(rows)
+        count += len(rows)
+        if count > limit:
+            break
+    positions = np.concatenate(found) if found else candidates[:0]
+
+    page = positions[:limit]
+    return {'rows': records(gene_rows, page),
+            'next': (encode_cursor(version, int(page[-1]) + 1)
+                     if len(positions) > limit else None)}
+
+
+def views(partitions):
+    return [{'cancer': cancer,
+             'target': target,
+             'heatmaps': {nam: {'label': part.label, 'genes': len(part.genes)}
+                          for nam, part in parts.items()}}
+            for (cancer, target), parts in sorted(partitions.items())]
+
+
+def _json(payload, status=200):
+    return flask.Response(metoncofit.cache.to_json(payload), status=status,
+                          mimetype='application/json')
+
+
+def enable(server, datasets, prefix='/api/v1'):
+    """
+    Serve the API for the current dataset of datasets (a metoncofit.dataset.Manager) from the Flask server.
+    """
+    def list_views():
+        return _json({'views': views(datasets.current.partitions)})
+
+    def rows():
+        dataset = datasets.current
+        args = flask.request.args
+        with metoncofit.metrics.CALLBACK.time(callback='api_rows'):
+            try:
+                page = query(dataset.gene_rows, dataset.version,
+                             gene=args.getlist('gene'),
+                             cancer=args.get('cancer'),
+                             target=args.get('target'),
+                             type=args.getlist('type'),
+                             feature=args.getlist('feature'),
+                             limit=args.get('limit'),
+                             cursor=args.get('cursor'))
+            except QueryError as e:
+                return _json({'error': str(e)}, 400)
+            return _json(page)
+
+    def batch():
+        dataset = datasets.current
+        body = flask.request.get_json(silent=True)
+        queries = body.get('queries') if isinstance(body, dict) else None
+        if not isinstance(queries, list):
+            return _json({'error': 'expected {"queries": [...]}'}, 400)
+        if len(queries) > MAX_BATCH:
+            return _json({'error': 'at most {} queries per batch'.format(MAX_BATCH)}, 400)
+
+        results = []
+        with metoncofit.metrics.CALLBACK.time(callback='api_batch'):
+            for params in queries:
+                try:
+                    if not isinstance(params, dict):
+                        raise QueryError('each query must be an object')
+                    unknown = set(params) - {'gene', 'cancer', 'target', 'type',
+                                             'feature', 'limit', 'cursor'}
+                    if unknown:
+                        raise QueryError('unknown parameters: '
+                                         + ', '.join(sorted(unknown)))
+                    results.append(query(dataset.gene_rows, dataset.version,
+                                         **params))
+                except QueryError as e:
+                    results.append({'error': str(e)})
+        return _json({'results': results})
+
+    server.add_url_rule(prefix + '/views', 'metoncofit_api_views', list_views)
+    server.add_url_rule(prefix + '/rows', 'metoncofit_api_rows', rows)
+    server.add_url_rule(prefix + '/batch', 'metoncofit_api_batch', batch,
+                        methods=['POST'])
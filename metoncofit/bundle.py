@@ -0,0 +1,181 @@
+"""
+MetOncoFit Interactive explorer heatmap bundle
+
+Every (Cancer, Target, direction) heatmap, ranked over all of its genes, and the rows of each gene (see metoncofit.data.GeneRows) are built once offline and written as NumPy arrays with JSON labels:
+
+    python -m metoncofit.bundle data/db.json data/bundle
+
+When the bundle matches the current db.json, the app memory-maps it instead of loading the table, so workers start without any pandas work and the callbacks only slice the stored matrices.
+@author: Scott Campit
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import metoncofit.data
+
+MANIFEST = 'manifest.json'
+
+
+def build(source, dest):
+    """
+    Write the bundle for the table in source and point the dest symlink at it, replacing any previous bundle there.
+    """
+    data = metoncofit.data.load_table(source)
+
+    dest = os.path.abspath(dest)
+    parent = os.path.dirname(dest)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(dest)+'.')
+    os.chmod(tmp, 0o755)
+    write(data, metoncofit.data.data_version(source), tmp)
+
+    # Each build gets its own directory, and dest is a symlink to the current
+    # one, replaced in a single rename so dest always names a complete bundle
+    old = os.path.realpath(dest) if os.path.islink(dest) else None
+    if os.path.isdir(dest) and old is None:
+        # A bundle written as a plain directory can't be renamed over
+        # atomically; remove it once
+        shutil.rmtree(dest)
+    link = tmp + '.link'
+    os.symlink(os.path.basename(tmp), link)
+    os.replace(link, dest)
+    if old is not None and old != tmp and os.path.isdir(old):
+        # Workers that mapped it keep their pages until they let go of them
+        shutil.rmtree(old)
+
+
+def write(data, version, directory):
+    """
+    Write the bundle for a compacted table (see metoncofit.data.compact) at the given data version into an existing, empty directory.
+    """
+    partitions = metoncofit.data.build_partitions(
+        data, metoncofit.data.direction_rows(data))
+
+    views = []
+    for i, (view, parts) in enumerate(sorted(partitions.items())):
+        for nam, part in sorted(parts.items()):
+            path = '{}-{}'.format(i, nam)
+            os.mkdir(os.path.join(directory, path))
+            matrix = part.ranked()
+            np.save(os.path.join(directory, path, 'z.npy'), matrix['z'])
+            np.save(os.path.join(directory, path, 'customdata.npy'),
+                    matrix['customdata'])
+            np.save(os.path.join(directory, path, 'rank.npy'),
+                    matrix['rank'].astype(np.int32))
+            np.save(os.path.join(directory, path, 'position.npy'),
+                    matrix['position'])
+            with open(os.path.join(directory, path, 'labels.json'), 'w') as f:
+                json.dump({'x': matrix['x'].tolist(), 'y': matrix['y'].tolist()}, f)
+            views.append({'cancer': view[0], 'target': view[1], 'direction': nam,
+                          'label': part.label, 'path': path})
+
+    genes = metoncofit.data.GeneRows.from_table(data)
+    os.mkdir(os.path.join(directory, 'genes'))
+    for nam in ('offsets', 'view_rows', 'view_offsets'):
+        np.save(os.path.join(directory, 'genes', nam+'.npy'), getattr(genes, nam))
+    for col, values in list(genes.codes.items()) + list(genes.measures.items()):
+        np.save(os.path.join(directory, 'genes', col+'.npy'), values)
+    with open(os.path.join(directory, 'genes', 'categories.json'), 'w') as f:
+        json.dump(genes.categories, f)
+
+    # Written last: a directory without a manifest is not a bundle
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump({'version': version,
+                   'summary': metoncofit.data.summary(data),
+                   'views': views}, f, indent=1)
+
+
+def load(directory, source=None):
+    """
+    The heatmaps of the bundle in directory as {(cancer, target): {direction: View}}, its metoncofit.data.GeneRows, and the widget summary and data version of the table it was built from. None if there is no bundle, or source has changed since it was built.
+    """
+    # Read through one build, even if the dest symlink moves meanwhile
+    directory = os.path.realpath(directory)
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if (source is not None and os.path.exists(source)
+            and metoncofit.data.data_version(source) != manifest['version']):
+        return None
+
+    partitions = {}
+    for view in manifest['views']:
+        partitions.setdefault((view['cancer'], view['target']), {})[
+            view['direction']] = View(os.path.join(directory, view['path']),
+                                      view['label'])
+
+    def mapped(nam):
+        return np.load(os.path.join(directory, 'genes', nam+'.npy'), mmap_mode='r')
+
+    with open(os.path.join(directory, 'genes', 'categories.json')) as f:
+        categories = json.load(f)
+    genes = metoncofit.data.GeneRows(
+        mapped('offsets'),
+        {col: mapped(col) for col in metoncofit.data.PROFILE_COLUMNS},
+        {col: mapped(col) for col in metoncofit.data.MEASURES},
+        categories, mapped('view_rows'), mapped('view_offsets'))
+    return partitions, genes, manifest['summary'], manifest['version']
+
+
+class View(object):
+    """
+    One heatmap of a bundle, read-only, with the methods of metoncofit.data.Partition the callbacks use. The stored matrices cover every gene in display order, so the heatmap for the first n genes keeps the columns ranked below n, and the rows with a cell in any of them ordered by their first cell in display order (as assets/metoncofit.js does in the browser).
+    """
+
+    def __init__(self, directory, label):
+        def mapped(nam):
+            return np.load(os.path.join(directory, nam+'.npy'), mmap_mode='r')
+
+        with open(os.path.join(directory, 'labels.json')) as f:
+            labels = json.load(f)
+        self.z = mapped('z')
+        self.customdata = mapped('customdata')
+        self.rank = mapped('rank')
+        self.position = mapped('position')
+        self.x = np.array(labels['x'], dtype=object)
+        self.y = np.array(labels['y'], dtype=object)
+        self.names = self.x[np.argsort(self.rank)]
+        self.genes = self.names
+        self.label = label
+
+    def matrix(self, n):
+        return self._columns(np.flatnonzero(self.rank < n))
+
+    def ranked(self):
+        return self.matrix(len(self.genes))
+
+    def gene(self, name):
+        cols = np.flatnonzero(self.x == name)
+        if not len(cols):
+            return None
+        return self._columns(cols)
+
+    def _columns(self, cols):
+        position = self.position[:, cols]
+        empty = np.iinfo(np.int32).max
+        first = np.where(position < 0, empty, position).min(axis=1)
+        rows = np.flatnonzero(first < empty)
+        rows = rows[np.argsort(first[rows], kind='mergesort')]
+        return {'x': self.x[cols],
+                'y': self.y[rows],
+                'z': self.z[np.ix_(rows, cols)],
+                'customdata': self.customdata[np.ix_(rows, cols)],
+                'rank': self.rank[cols],
+                'position': position[rows]}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('source', help='db.json to read')
+    parser.add_argument('dest', help='directory to write the bundle to')
+    args = parser.parse_args()
+    build(args.source, args.dest)
@@ -0,0 +1,160 @@
+"""
+MetOncoFit Interactive explorer figure cache
+@author: Scott Campit
+"""
+
+import collections
+import json
+import threading
+
+import plotly
+from dash import no_update
+from dash.exceptions import PreventUpdate
+
+import metoncofit.config
+import metoncofit.metrics
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional
+    orjson = None
+
+
+# Metric label for input values there is no data for
+OTHER = 'other'
+
+
+def _default(obj):
+    """
+    Encode what orjson can't by itself (pandas indexes, object and non-contiguous arrays), then anything else the way Plotly does.
+    """
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return plotly.utils.PlotlyJSONEncoder().default(obj)
+
+
+def to_json(figure):
+    """
+    Serialize a figure to the JSON Dash would send. With orjson (METONCOFIT_SERIALIZER=orjson, the default when it is installed), NumPy arrays are written straight from their buffers instead of element by element, and float32 values keep their short form; NaN becomes null either way.
+    """
+    if orjson is not None and metoncofit.config.SERIALIZER == 'orjson':
+        return orjson.dumps(figure, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8')
+
+
+class FigureCache(object):
+    """
+    Bounded, thread-safe LRU cache of serialized figures.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._figures = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        # Data versions whose figures are stored; None for any
+        self._versions = None
+
+    def get(self, key, build):
+        """
+        Return the cached bytes for key, calling build() to make them on a miss.
+        """
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                metoncofit.metrics.CACHE.inc(result='hit')
+                return self._figures[key]
+            self.misses += 1
+        metoncofit.metrics.CACHE.inc(result='miss')
+
+        figure = build()
+        with self._lock:
+            if self._versions is not None and key[0] not in self._versions:
+                # Built by a request still in flight on a replaced version
+                return figure
+            self._figures[key] = figure
+            while len(self._figures) > self.maxsize:
+                self._figures.popitem(last=False)
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+
+    def prune(self, *versions):
+        """
+        Drop the figures of every data version but the given ones (the first item of the keys cached_callback makes), and stop storing figures for any other version.
+        """
+        with self._lock:
+            self._versions = set(versions)
+            for key in [key for key in self._figures if key[0] not in versions]:
+                del self._figures[key]
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._figures), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def cached_callback(app, cache, output, inputs, state=(), labels=(), key=None,
+                    version=None, known=None):
+    """
+    Register a figure callback whose serialized response is kept in the cache, keyed on the data version (given by calling version), the outputs and the input and state values. Cache hits are written straight into the response without touching pandas or Plotly. When given, key maps the input values to the values the figures actually depend on, which are then used for the cache key and passed to the callback.
+
+    Latency and response size are recorded in metoncofit.metrics under the callback's name, with the leading input values as the given labels. Clients can post any value, so when known is given (a function returning the tuples of label values there is data for), every other combination is recorded under OTHER to keep the number of series bounded.
+    """
+    def wrap_func(func):
+        before = set(app.callback_map)
+        app.callback(output, inputs, list(state))(func)
+        callback_id, = set(app.callback_map) - before
+
+        def render(*args):
+            value = func(*args)
+            if not isinstance(output, (list, tuple)):
+                response = {'response': {
+                    'props': {output.component_property: value}}}
+            else:
+                response = collections.defaultdict(dict)
+                for o, val in zip(output, value):
+                    if val is not no_update:
+                        response[o.component_id][o.component_property] = val
+                if not response:
+                    raise PreventUpdate
+                response = {'response': response, 'multi': True}
+
+            with metoncofit.metrics.STAGE.time(stage='serialize'):
+                return to_json(response)
+
+        def respond(*args):
+            if key is not None:
+                args = tuple(key(*args))
+            view = dict(zip(labels, args))
+            if known is not None and tuple(args[:len(labels)]) not in known():
+                view = dict.fromkeys(labels, OTHER)
+            with metoncofit.metrics.CALLBACK.time(callback=func.__name__, **view):
+                body = cache.get(
+                    (version() if version else None, callback_id) + args,
+                    lambda: render(*args))
+            metoncofit.metrics.RESPONSE.observe(len(body), callback=func.__name__)
+            return body
+
+        app.callback_map[callback_id]['callback'] = respond
+        return respond
+    return wrap_func
+
+
+def warm(callbacks, keys):
+    """
+    Fill the cache with the given [cancer, target, genes] views, skipping any that have no data.
+    """
+    for args in keys:
+        for callback in callbacks:
+            try:
+                callback(*args)
+            except PreventUpdate:
+                pass
@@ -0,0 +1,82 @@
+"""
+MetOncoFit Interactive explorer settings
+
+Every setting can be overridden with an environment variable of the same name prefixed with METONCOFIT_.
+@author: Scott Campit
+"""
+
+import os
+import json
+import multiprocessing
+
+# Path of db.json; defaults to data/db.json next to run_app.py
+DATA = os.environ.get('METONCOFIT_DATA')
+
+# Directory written by `python -m metoncofit.bundle`; defaults to data/bundle
+# next to run_app.py. It is only used while it matches db.json.
+BUNDLE = os.environ.get('METONCOFIT_BUNDLE')
+
+# Seconds between checks of db.json for a new version, which is then loaded in
+# the background and swapped in without a restart. 0 only loads it at startup.
+RELOAD_INTERVAL = float(os.environ.get('METONCOFIT_RELOAD_INTERVAL', 0))
+
+# Bearer token for POST /admin/reload, which reloads db.json in every worker.
+# Unset to disable the endpoint.
+RELOAD_TOKEN = os.environ.get('METONCOFIT_RELOAD_TOKEN')
+
+# File through which the endpoint tells the other workers to reload; defaults
+# to one in the temporary directory. Set it to a shared path when the workers
+# run on several hosts.
+RELOAD_MARKER = os.environ.get('METONCOFIT_RELOAD_MARKER')
+
+# Number of serialized figures each worker keeps in memory
+CACHE_SIZE = int(os.environ.get('METONCOFIT_CACHE_SIZE', 256))
+
+# [cancer, target, genes] views that are built when a worker starts
+CACHE_WARM = json.loads(os.environ.get(
+    'METONCOFIT_CACHE_WARM',
+    '[["Pan Cancer", "Differential Expression", 25]]'))
+
+# Directory (ideally on tmpfs, e.g. /dev/shm/metoncofit) where the heatmaps and
+# gene rows are exported once per data version and memory-mapped by every
+# worker. Unset to load per worker.
+SHARED_DIR = os.environ.get('METONCOFIT_SHARED_DIR')
+
+# Server settings, used by gunicorn.conf.py and by `python run_app.py`
+HOST = os.environ.get('METONCOFIT_HOST', '127.0.0.1')
+PORT = int(os.environ.get('METONCOFIT_PORT', 8050))
+WORKERS = int(os.environ.get('METONCOFIT_WORKERS',
+                             multiprocessing.cpu_count() * 2 + 1))
+THREADS = int(os.environ.get('METONCOFIT_THREADS', 4))
+TIMEOUT = int(os.environ.get('METONCOFIT_TIMEOUT', 60))
+DEBUG = os.environ.get('METONCOFIT_DEBUG', '').lower() in ('1', 'true', 'yes')
+
+# Serve the Prometheus metrics at /metrics. The endpoint has no access
+# control, so block it at the reverse proxy or turn it off in public setups.
+METRICS = os.environ.get('METONCOFIT_METRICS', '1').lower() in ('1', 'true', 'yes')
+
+# gzip settings for Flask-Compress, which Dash enables on the server
+COMPRESS_LEVEL = int(os.environ.get('METONCOFIT_COMPRESS_LEVEL', 6))
+COMPRESS_MIN_SIZE = int(os.environ.get('METONCOFIT_COMPRESS_MIN_SIZE', 500))
+
+# When the gene slider updates the heatmaps: 'mouseup' (on release), 'drag'
+# (on every step, which sends a request per step while dragging) or 'client'
+# (on every step, sliced in the browser from the views sent when the cancer
+# or target changes, so dragging never reaches the server)
+SLIDER_MODE = os.environ.get('METONCOFIT_SLIDER_MODE', 'mouseup')
+
+# Check every callback figure against the Plotly schema. Off by default since
+# validation is slower than building the figure; defaults to METONCOFIT_DEBUG.
+VALIDATE_FIGURES = os.environ.get(
+    'METONCOFIT_VALIDATE_FIGURES', str(DEBUG)).lower() in ('1', 'true', 'yes')
+
+# JSON encoder for the callback responses: 'orjson' (used when installed) or
+# 'plotly' (the PlotlyJSONEncoder Dash uses)
+SERIALIZER = os.environ.get('METONCOFIT_SERIALIZER', 'orjson')
+
+# Level of detail for wide heatmaps in the 'mouseup' and 'drag' slider modes:
+# views with more genes than LOD_COLUMNS are sent as at most that many columns,
+# each the mean (or 'max') of a run of adjacent genes, and zooming into the x
+# axis fetches the genes in the zoomed range. 0 sends every gene.
+LOD_COLUMNS = int(os.environ.get('METONCOFIT_LOD_COLUMNS', 0))
+LOD_AGGREGATE = os.environ.get('METONCOFIT_LOD_AGGREGATE', 'mean')
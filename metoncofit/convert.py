@@ -0,0 +1,35 @@
+"""
+Convert db.json into the columnar file the MetOncoFit explorer loads at startup
+
+    python -m metoncofit.convert data/db.json data/db.feather
+
+The output format follows the extension (.feather or .parquet) and needs pyarrow.
+@author: Scott Campit
+"""
+
+import argparse
+
+import pandas as pd
+
+import metoncofit.data
+
+
+def convert(source, dest):
+    """
+    Write the table in source to dest with the string columns encoded as categoricals and the measures as float32.
+    """
+    data = metoncofit.data.compact(pd.read_json(source))
+
+    if dest.endswith('.parquet'):
+        data.to_parquet(dest)
+    else:
+        data.to_feather(dest)
+    return data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('source', help='db.json to read')
+    parser.add_argument('dest', help='.feather or .parquet file to write')
+    args = parser.parse_args()
+    convert(args.source, args.dest)
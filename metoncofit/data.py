@@ -0,0 +1,377 @@
+"""
+MetOncoFit Interactive explorer data index
+@author: Scott Campit
+"""
+
+import hashlib
+import os
+
+import pandas as pd
+import numpy as np
+
+# Columns of db.json, in order
+COLUMNS = ['Gene', 'Feature', 'Value', 'R', 'Gini', 'Cancer', 'Target', 'Type']
+
+# String columns held as categoricals, and measures held as float32
+CATEGORIES = ['Gene', 'Feature', 'Cancer', 'Target', 'Type']
+MEASURES = ['Value', 'R', 'Gini']
+
+# Columns kept, with the measures, for the gene profiles and exports
+PROFILE_COLUMNS = ['Cancer', 'Target', 'Feature', 'Type']
+
+# Binary copies of db.json, in order of preference
+FORMATS = [('.feather', pd.read_feather), ('.parquet', pd.read_parquet)]
+
+# data_version of each (file, modification time, size) already hashed
+_versions = {}
+
+# Target labels drawn in each of the three heatmaps
+DIRECTIONS = {
+    'up': ['UPREGULATED', 'GAIN'],
+    'neut': ['NEUTRAL', 'NEUT'],
+    'down': ['DOWNREGULATED', 'LOSS']
+    }
+
+
+def find_source(path):
+    """
+    The file load_table reads for path: a Feather or Parquet copy of the JSON file (see metoncofit.convert) when one exists and is up to date, otherwise the JSON file itself.
+    """
+    root, _ = os.path.splitext(path)
+    for ext, reader in FORMATS:
+        fast = root + ext
+        if not os.path.exists(fast):
+            continue
+        if os.path.exists(path) and os.path.getmtime(fast) < os.path.getmtime(path):
+            continue
+        return fast, reader
+    return path, pd.read_json
+
+
+def data_version(path):
+    """
+    Short tag that changes whenever the content of the file load_table reads for path changes. It doesn't depend on the modification time, so a bundle stays valid when it is copied, synced or checked out along with db.json. The file is only hashed again when its size or modification time changes.
+    """
+    source = find_source(path)[0]
+    stat = os.stat(source)
+    key = (source, stat.st_mtime_ns, stat.st_size)
+    version = _versions.get(key)
+    if version is None:
+        digest = hashlib.sha1()
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        version = _versions[key] = digest.hexdigest()[:16]
+    return version
+
+
+def load_table(path):
+    """
+    Read the gene-feature table, preferring the binary copy picked by find_source.
+    """
+    source, reader = find_source(path)
+    try:
+        return compact(reader(source))
+    except ImportError:
+        # pyarrow is optional
+        return compact(pd.read_json(path))
+
+
+def compact(data):
+    """
+    Encode the string columns as categoricals and the measures as float32, so equality filters compare integer codes.
+    """
+    data = data.reset_index(drop=True)
+    for col in CATEGORIES:
+        data[col] = data[col].astype('category')
+    for col in MEASURES:
+        data[col] = data[col].astype(np.float32)
+    return data
+
+
+def summary(data):
+    """
+    What the widgets show of the table: the number of genes, and the cancers and targets in order of appearance.
+    """
+    return {'genes': int(data['Gene'].nunique()),
+            'cancers': [str(c) for c in data['Cancer'].unique()],
+            'targets': [str(t) for t in data['Target'].unique()]}
+
+
+def direction_rows(data):
+    """
+    Row positions of each of the three heatmaps, sorted by Gini.
+    """
+    rows = {}
+    for nam, labels in DIRECTIONS.items():
+        positions = np.flatnonzero(data['Type'].isin(labels).values)
+        gini = pd.DataFrame({'Gini': data['Gini'].values[positions]})
+        gini = gini.sort_values(by='Gini', ascending=False)
+        rows[nam] = positions[gini.index.values].astype(np.int32)
+    return rows
+
+
+class Partition(object):
+    """
+    One (Cancer, Target, direction) group. Genes are ranked by their first appearance under the Gini sort, and the rows are stored grouped by that rank, so the rows of the first n genes are the contiguous slice rows[:offsets[n]]. Each stored row also keeps its position in the display order (Gini, then Value, descending).
+    """
+
+    def __init__(self, table, rows):
+        gene = table['Gene'].cat.codes.values
+        rank, self.genes = pd.factorize(gene[rows])
+        display = np.lexsort((-table['Value'].values[rows],
+                              -table['Gini'].values[rows]))
+        by_rank = np.argsort(rank[display], kind='mergesort')
+
+        self.table = table
+        self.rows = rows[display][by_rank]
+        self.rank = rank[display][by_rank].astype(np.int32)
+        self.position = by_rank.astype(np.int32)
+        self.offsets = np.searchsorted(self.rank, np.arange(len(self.genes)+1))
+        # Display position of each gene's first row, by rank
+        self.first = self.position[self.offsets[:-1]]
+        self.label = table['Type'].iat[rows[0]]
+
+    def matrix(self, n):
+        """
+        Dense features x genes matrices of Value and R for the first n genes, with NaN where a gene has no value for a feature. Genes and features are in the order they first appear in display order, 'rank' holds the rank of each column's gene and 'position' the display position of each cell (-1 where empty), from which the matrices for fewer genes can be cut out (see metoncofit.bundle.View).
+        """
+        n = min(n, len(self.genes))
+        stop = self.offsets[n]
+        rows = self.rows[:stop]
+        position = self.position[:stop]
+
+        # Columns follow each gene's first row in display order
+        ranks = np.argsort(self.first[:n])
+        col = np.empty(n, dtype=np.intp)
+        col[ranks] = np.arange(n)
+
+        # Rows follow each feature's first row in display order
+        feature = self.table['Feature'].cat.codes.values[rows]
+        first = np.full(len(self.table['Feature'].cat.categories),
+                        len(self.position), dtype=np.int64)
+        np.minimum.at(first, feature, position)
+        features = np.flatnonzero(first < len(self.position))
+        features = features[np.argsort(first[features])]
+        row = np.empty(len(first), dtype=np.intp)
+        row[features] = np.arange(len(features))
+
+        value = np.full((len(features), n), np.nan, dtype=np.float32)
+        r = value.copy()
+        value[row[feature], col[self.rank[:stop]]] = self.table['Value'].values[rows]
+        r[row[feature], col[self.rank[:stop]]] = self.table['R'].values[rows]
+        cell = np.full((len(features), n), -1, dtype=np.int32)
+        cell[row[feature], col[self.rank[:stop]]] = position
+
+        return {'x': self.table['Gene'].cat.categories[self.genes[ranks]],
+                'y': self.table['Feature'].cat.categories[features],
+                'z': value,
+                'customdata': r,
+                'rank': ranks,
+                'position': cell}
+
+    def ranked(self):
+        """
+        Matrices for every gene, so the matrices for the first n genes can be sliced out later without the table (see assets/metoncofit.js).
+        """
+        return self.matrix(len(self.genes))
+
+    @property
+    def names(self):
+        """
+        Gene names, by rank.
+        """
+        return self.table['Gene'].cat.categories[self.genes]
+
+    def gene(self, name):
+        """
+        Matrices for the single gene called name, in the same form as matrix, or None if it isn't in this heatmap.
+        """
+        code = self.table['Gene'].cat.categories.get_indexer([name])[0]
+        rank = np.flatnonzero(self.genes == code)
+        if code < 0 or not len(rank):
+            return None
+        start, stop = self.offsets[rank[0]], self.offsets[rank[0]+1]
+        rows = self.rows[start:stop]
+        feature = self.table['Feature'].cat.codes.values[rows]
+        return {'x': pd.Index([name]),
+                'y': self.table['Feature'].cat.categories[feature],
+                'z': self.table['Value'].values[rows][:, None],
+                'customdata': self.table['R'].values[rows][:, None],
+                'rank': rank[:1],
+                'position': self.position[start:stop][:, None]}
+
+
+def bin_columns(matrix, start, stop, bins, how='mean'):
+    """
+    Columns start to stop of the matrices from Partition.matrix, merged into at most `bins` runs of adjacent genes. z holds the mean (or with how='max', the max) value of each run and customdata its mean R, ignoring missing values. 'edges' holds the column where each run starts, followed by stop, and 'genes' the names of the genes in each run.
+    """
+    edges = np.unique(np.linspace(start, stop, min(bins, stop - start) + 1)
+                      .round().astype(np.intp))
+    offsets = edges[:-1] - start
+
+    def mean(values):
+        values = values[:, start:stop]
+        valid = ~np.isnan(values)
+        total = np.add.reduceat(np.where(valid, values, 0), offsets, axis=1)
+        count = np.add.reduceat(valid.astype(np.int32), offsets, axis=1)
+        with np.errstate(invalid='ignore'):
+            return (total / count).astype(np.float32)
+
+    if how == 'max':
+        z = np.fmax.reduceat(matrix['z'][:, start:stop], offsets, axis=1)
+    else:
+        z = mean(matrix['z'])
+    return {'edges': edges,
+            'genes': np.split(np.asarray(matrix['x'])[start:stop], offsets[1:]),
+            'y': matrix['y'],
+            'z': z,
+            'customdata': mean(matrix['customdata'])}
+
+
+def build_partitions(data, directions):
+    """
+    Split each direction by (Cancer, Target) once, so the callbacks only do a dictionary lookup and a slice.
+    """
+    cancer = data['Cancer'].cat.codes.values.astype(np.int64)
+    target = data['Target'].cat.codes.values.astype(np.int64)
+    num_targets = len(data['Target'].cat.categories)
+
+    partitions = {}
+    for nam, rows in directions.items():
+        key = cancer[rows] * num_targets + target[rows]
+        order = np.argsort(key, kind='mergesort')
+        bounds = np.flatnonzero(np.diff(key[order])) + 1
+        for group in np.split(rows[order], bounds):
+            if not len(group):
+                continue
+            view = (data['Cancer'].iat[group[0]], data['Target'].iat[group[0]])
+            partitions.setdefault(view, {})[nam] = Partition(data, group)
+    return partitions
+
+
+class GeneRows(object):
+    """
+    The table's rows grouped by gene, so that a gene's rows are the contiguous run between two offsets. A gene's profile across every cancer and target costs time in its own rows, not the table's, and the rows can be exported without the table. The positions of the rows of each (Cancer, Target) view are kept as well, in gene order, so a view's rows are also one run.
+    """
+
+    def __init__(self, offsets, codes, measures, categories,
+                 view_rows=None, view_offsets=None):
+        self.offsets = offsets
+        self.codes = codes
+        self.measures = measures
+        self.categories = categories
+        if view_rows is None:
+            key = self._view_key(codes['Cancer'].astype(np.int64), codes['Target'])
+            view_rows = np.argsort(key, kind='mergesort').astype(np.int32)
+            view_offsets = np.searchsorted(
+                key[view_rows], np.arange(self._view_key(len(categories['Cancer']), 0)+1))
+        self.view_rows = view_rows
+        self.view_offsets = view_offsets
+        self._genes = {name: i for i, name in enumerate(categories['Gene'])}
+
+    def _view_key(self, cancer, target):
+        return cancer * len(self.categories['Target']) + target
+
+    @classmethod
+    def from_table(cls, table):
+        gene = table['Gene'].cat.codes.values
+        rows = np.argsort(gene, kind='mergesort')
+        offsets = np.searchsorted(gene[rows],
+                                  np.arange(len(table['Gene'].cat.categories)+1))
+        return cls(offsets,
+                   {col: table[col].cat.codes.values[rows] for col in PROFILE_COLUMNS},
+                   {col: table[col].values[rows] for col in MEASURES},
+                   {col: table[col].cat.categories.tolist()
+                    for col in ['Gene'] + PROFILE_COLUMNS})
+
+    def profile(self, name):
+        """
+        Targets x cancers x features matrices of Value and R for the gene called name, with NaN where a cancer has no value for a feature, and the gene's target label in each cancer. None if there is no such gene.
+        """
+        code = self._genes.get(name)
+        if code is None or self.offsets[code] == self.offsets[code+1]:
+            return None
+        run = slice(self.offsets[code], self.offsets[code+1])
+        cancer, target, feature, kind = [self.codes[col][run] for col in PROFILE_COLUMNS]
+
+        axes = [np.unique(codes) for codes in (target, cancer, feature)]
+        t, c, f = [np.searchsorted(axis, codes)
+                   for axis, codes in zip(axes, (target, cancer, feature))]
+        shape = tuple(len(axis) for axis in axes)
+        value = np.full(shape, np.nan, dtype=np.float32)
+        r = value.copy()
+        value[t, c, f] = self.measures['Value'][run]
+        r[t, c, f] = self.measures['R'][run]
+        labels = np.full(shape[:2], '', dtype=object)
+        labels[t, c] = np.asarray(self.categories['Type'], dtype=object)[kind]
+
+        names = [[self.categories[col][i] for i in axis]
+                 for col, axis in zip(['Target', 'Cancer', 'Feature'], axes)]
+        return {'gene': name,
+                'targets': names[0],
+                'cancers': names[1],
+                'features': names[2],
+                'z': value,
+                'customdata': r,
+                'type': labels}
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def genes(self, names, ordered=False):
+        """
+        Positions of the rows of the named genes, in gene order, or in the order of names if ordered.
+        """
+        codes = [self._genes[name] for name in names if name in self._genes]
+        if not ordered:
+            codes = sorted(set(codes))
+        if not codes:
+            return np.zeros(0, dtype=np.intp)
+        return np.concatenate([np.arange(self.offsets[code], self.offsets[code+1])
+                               for code in codes])
+
+    def view(self, cancer, target):
+        """
+        Positions of the rows of one (Cancer, Target) view, in gene order.
+        """
+        if (cancer not in self.categories['Cancer']
+                or target not in self.categories['Target']):
+            return np.zeros(0, dtype=np.intp)
+        key = self._view_key(self.categories['Cancer'].index(cancer),
+                             self.categories['Target'].index(target))
+        return self.view_rows[self.view_offsets[key]:self.view_offsets[key+1]]
+
+    def where(self, positions, **labels):
+        """
+        The positions whose rows have one of the given labels in each column, e.g. where(positions, Type=['GAIN', 'LOSS']). Columns given None aren't filtered.
+        """
+        keep = np.ones(len(positions), dtype=bool)
+        for col, values in labels.items():
+            if values is None:
+                continue
+            wanted = set(values)
+            keep &= np.isin(self.codes[col][positions],
+                            [i for i, label in enumerate(self.categories[col])
+                             if label in wanted])
+        return positions[keep]
+
+    def select(self, names, cancer, target, types):
+        """
+        Positions of the rows of the named genes, in that order, in the given cancer and target with one of the given Type labels.
+        """
+        return self.where(self.genes(names, ordered=True), Cancer=[cancer],
+                          Target=[target], Type=types)
+
+    def frame(self, positions):
+        """
+        The rows at positions, with the columns of db.json.
+        """
+        gene = np.searchsorted(self.offsets, positions, side='right') - 1
+        columns = {'Gene': pd.Categorical.from_codes(gene, self.categories['Gene'])}
+        for col in PROFILE_COLUMNS:
+            columns[col] = pd.Categorical.from_codes(self.codes[col][positions],
+                                                     self.categories[col])
+        for col in MEASURES:
+            columns[col] = self.measures[col][positions]
+        return pd.DataFrame(columns, columns=COLUMNS)
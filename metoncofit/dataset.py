@@ -0,0 +1,320 @@
+"""
+MetOncoFit Interactive explorer dataset manager
+
+Everything the app builds from db.json (the heatmap views, the rows grouped by gene, the widget summary and the gene search index) is held in one Dataset. Manager loads a new Dataset in a background thread whenever db.json changes, or when an admin asks for it, and swaps it in with a single assignment once it is complete, so no request ever sees a half-built dataset and the app never stops serving.
+
+Each request is pinned to the dataset that was current when it came in, and reads it through Manager.current until it ends, so requests in flight when a new version is swapped in finish on the old one. Figure caches key their entries on the data version.
+
+A reload asked through the admin endpoint is passed on to every worker through a marker file holding a new generation, which each worker's watcher checks, so the workers don't stay on mixed versions.
+@author: Scott Campit
+"""
+
+import contextlib
+import hashlib
+import hmac
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import flask
+
+import metoncofit.bundle
+import metoncofit.config
+import metoncofit.data
+import metoncofit.metrics
+import metoncofit.search
+import metoncofit.shared
+
+log = logging.getLogger(__name__)
+
+# Seconds between checks of the reload marker when the data file itself isn't
+# watched
+MARKER_INTERVAL = 1.0
+
+
+class Dataset(object):
+    """
+    One version of db.json with its indexes. lock is the file that keeps its shared copy (see metoncofit.shared), if any, in place while the dataset is in use; it is closed when the dataset is freed.
+    """
+
+    def __init__(self, version, partitions, gene_rows, summary, gene_index,
+                 lock=None):
+        self.version = version
+        self.partitions = partitions
+        self.gene_rows = gene_rows
+        self.summary = summary
+        self.gene_index = gene_index
+        self.lock = lock
+
+
+def load(path, bundle=None, timer=metoncofit.metrics.STARTUP):
+    """
+    Dataset for the current version of path: read from the bundle directory when it is up to date, otherwise memory-mapped from the copy in SHARED_DIR when set, or else loaded from the table with the indexes built here. The time spent in each stage is recorded in timer.
+    """
+    lock = None
+    with timer.time(stage='load'):
+        # Heatmaps precomputed by `python -m metoncofit.bundle`, if up to date
+        loaded = metoncofit.bundle.load(bundle, path) if bundle else None
+        if loaded is None and metoncofit.config.SHARED_DIR:
+            # Read-only heatmaps and gene rows shared by every worker
+            loaded, lock = metoncofit.shared.load(
+                path, metoncofit.config.SHARED_DIR)
+        if loaded is not None:
+            partitions, gene_rows, summary, version = loaded
+        else:
+            version = metoncofit.data.data_version(path)
+            df = metoncofit.data.load_table(path)
+
+            # Row positions of the three heat maps, sorted by Gini
+            directions = metoncofit.data.direction_rows(df)
+
+    if loaded is None:
+        # Index the (Cancer, Target) views and their three heatmaps once
+        with timer.time(stage='index'):
+            partitions = metoncofit.data.build_partitions(df, directions)
+            summary = metoncofit.data.summary(df)
+
+            # Rows of each gene, for the gene profile
+            gene_rows = metoncofit.data.GeneRows.from_table(df)
+
+    # Prefix index over the genes of every cancer and target, for the search box
+    with timer.time(stage='search'):
+        gene_index = metoncofit.search.GeneIndex.from_partitions(partitions)
+
+    return Dataset(version, partitions, gene_rows, summary, gene_index, lock)
+
+
+class Manager(object):
+    """
+    Holder of the current Dataset of path, which replaces it when path changes. prepare, when given, is called with each new dataset before it is swapped in (e.g. to warm the figure caches), and swapped with it right after (e.g. to drop the figures of older versions).
+    """
+
+    def __init__(self, path, bundle=None, prepare=None, swapped=None):
+        self.path = path
+        self.bundle = bundle
+        self.prepare = prepare
+        self.swapped = swapped
+        self._dataset = load(path, bundle)
+        self._local = threading.local()
+        self._reload_lock = threading.Lock()
+        self._interval = 0
+        self._watcher = None
+        self._watch_lock = threading.Lock()
+
+        # Version that last failed to load, not retried until path changes again
+        self._failed = None
+
+        # Reload marker shared by the workers (see enable), and the last
+        # generation read from it
+        self._marker = None
+        self._generation = None
+
+    @property
+    def current(self):
+        """
+        The dataset pinned to this thread, or else to the request being served, or else the latest one.
+        """
+        dataset = getattr(self._local, 'dataset', None)
+        if dataset is None and flask.has_app_context():
+            dataset = flask.g.get('metoncofit_dataset')
+        return dataset or self._dataset
+
+    @property
+    def latest(self):
+        """
+        The dataset new requests are pinned to.
+        """
+        return self._dataset
+
+    @contextlib.contextmanager
+    def pinned(self, dataset=None):
+        """
+        Read dataset (by default the latest one) through current for the duration of the block.
+        """
+        previous = getattr(self._local, 'dataset', None)
+        self._local.dataset = dataset or self._dataset
+        try:
+            yield self._local.dataset
+        finally:
+            self._local.dataset = previous
+
+    @property
+    def reloading(self):
+        return self._reload_lock.locked()
+
+    def reload(self, force=False, block=True):
+        """
+        Load path and swap the new dataset in, unless it is the version already served (or force). If another reload is running, wait for it first, or with block=False return None right away. Returns the version served afterwards.
+        """
+        if not self._reload_lock.acquire(block):
+            return None
+        try:
+            version = metoncofit.data.data_version(self.path)
+            if not force and version == self._dataset.version:
+                return version
+            with metoncofit.metrics.RELOAD.time():
+                try:
+                    dataset = load(self.path, self.bundle,
+                                   timer=metoncofit.metrics.RELOAD_STAGE)
+                    if self.prepare is not None:
+                        self.prepare(dataset)
+                except Exception:
+                    self._failed = version
+                    metoncofit.metrics.RELOADS.inc(result='error')
+                    log.exception('Could not reload %s; still serving %s',
+                                  self.path, self._dataset.version)
+                    raise
+            self._dataset = dataset
+            if self.swapped is not None:
+                self.swapped(dataset)
+            self._cleanup()
+            metoncofit.metrics.RELOADS.inc(result='ok')
+            log.info('Now serving %s version %s', self.path, dataset.version)
+            return dataset.version
+        finally:
+            self._reload_lock.release()
+
+    def reload_in_background(self, force=False):
+        """
+        Run reload in a daemon thread.
+        """
+        def run():
+            try:
+                self.reload(force)
+            except Exception:
+                # Already logged, and the current dataset is kept
+                pass
+        thread = threading.Thread(target=run, name='metoncofit-reload')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def watch(self, interval):
+        """
+        Check path for changes every interval seconds, and reload once a new version has stayed the same for two checks in a row (so a file still being written is left alone). The watcher thread is started by ensure_watching in each worker after gunicorn forks it (see gunicorn.conf.py), or else by the first request of each process, since threads don't survive the fork.
+        """
+        self._interval = interval
+
+    def ensure_watching(self):
+        """
+        Start the watcher thread of this process if watch was called or reloads are signalled through a marker, unless it is running already.
+        """
+        if not (self._interval or self._marker) or self._watcher == os.getpid():
+            return
+        with self._watch_lock:
+            if self._watcher == os.getpid():
+                return
+            thread = threading.Thread(target=self._watch, name='metoncofit-watch')
+            thread.daemon = True
+            thread.start()
+            self._watcher = os.getpid()
+
+    def _cleanup(self):
+        """
+        Remove the shared copies of versions no process serves any more, such as the one just swapped out once its last request is done.
+        """
+        if metoncofit.config.SHARED_DIR:
+            try:
+                metoncofit.shared.cleanup(metoncofit.config.SHARED_DIR)
+            except OSError:
+                log.exception('Could not clean up %s', metoncofit.config.SHARED_DIR)
+
+    def _read_marker(self):
+        try:
+            with open(self._marker) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _signal(self, force):
+        """
+        Write a new generation to the marker, which every other worker's watcher picks up, and return it.
+        """
+        generation = '{} {}'.format(uuid.uuid4().hex, 'force' if force else 'changed')
+        self._generation = generation
+        tmp = '{}.{}.tmp'.format(self._marker, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(generation + '\n')
+        os.replace(tmp, self._marker)
+        return generation
+
+    def _watch(self):
+        try:
+            seen = metoncofit.data.data_version(self.path)
+        except OSError:
+            seen = None
+        while True:
+            time.sleep(self._interval or MARKER_INTERVAL)
+            self._cleanup()
+            if self._marker is not None:
+                generation = self._read_marker()
+                if generation is not None and generation != self._generation:
+                    # A reload was asked of another worker
+                    self._generation = generation
+                    try:
+                        self.reload(force=generation.endswith(' force'))
+                    except Exception:
+                        pass
+                    continue
+            if not self._interval:
+                continue
+            try:
+                version = metoncofit.data.data_version(self.path)
+            except OSError:
+                # The file is being replaced
+                seen = None
+                continue
+            if (version == seen and version != self._dataset.version
+                    and version != self._failed):
+                try:
+                    self.reload(block=False)
+                except Exception:
+                    pass
+            seen = version
+
+    def enable(self, server, path='/admin/reload', token=None, marker=None):
+        """
+        Pin every request of server to the dataset current when it comes in, and start watching path if watch was called. With a token, POST path with the header "Authorization: Bearer <token>" reloads the dataset of the process that answers in the background, answering 202, or 409 if a reload is already running. Add ?wait=1 to answer with the version served once the reload is done (waiting for a running one first), or ?force=1 to reload an unchanged file. The other workers are told to reload through the marker file, checked every second (or every watch interval) by each of them; it defaults to a file in the temporary directory named after the data path, so it must be set to a shared path when the workers run on several hosts.
+        """
+        @server.before_request
+        def _pin_dataset():
+            self.ensure_watching()
+            flask.g.metoncofit_dataset = self._dataset
+
+        if not token:
+            return
+
+        self._marker = marker or os.path.join(
+            tempfile.gettempdir(), 'metoncofit-reload-' + hashlib.sha1(
+                os.path.abspath(self.path).encode('utf-8')).hexdigest()[:16])
+        # Reloads asked before this process started are already in its data
+        self._generation = self._read_marker()
+
+        expected = ('Bearer ' + token).encode('utf-8')
+
+        def reload():
+            given = flask.request.headers.get('Authorization', '').encode('utf-8')
+            if not hmac.compare_digest(given, expected):
+                return flask.Response('forbidden\n', status=403,
+                                      mimetype='text/plain')
+            force = flask.request.args.get('force') in ('1', 'true', 'yes')
+            if flask.request.args.get('wait') not in ('1', 'true', 'yes'):
+                if self.reloading:
+                    return flask.Response('a reload is already running\n',
+                                          status=409, mimetype='text/plain')
+                self._signal(force)
+                self.reload_in_background(force)
+                return flask.Response('reloading\n', status=202,
+                                      mimetype='text/plain')
+            self._signal(force)
+            try:
+                version = self.reload(force)
+            except Exception:
+                # Logged by reload
+                return flask.Response('reload failed; see the server log\n',
+                                      status=500, mimetype='text/plain')
+            return flask.Response(version + '\n', mimetype='text/plain')
+        server.add_url_rule(path, 'metoncofit_reload', reload, methods=['POST'])
@@ -0,0 +1,59 @@
+"""
+MetOncoFit Interactive explorer ETags
+
+The Dash layout and callback dependencies only change with the dataset, the code and the settings, so a strong ETag is derived from the data version and a build token standing for the other two, and checked before they are built. The responses are marked no-cache, so browsers revalidate them with If-None-Match on every load and pick up a new callback graph right after a deploy. Callback responses are not tagged: they answer POSTs, which browsers never revalidate, so hashing their bodies would only cost time.
+@author: Scott Campit
+"""
+
+import hashlib
+
+import flask
+
+# Dash endpoints whose GET responses are tagged
+PATHS = ('_dash-layout', '_dash-dependencies')
+
+
+def make(version, path, encoding='', build=''):
+    """
+    ETag for the response at path under the given data version, content encoding and build token.
+    """
+    digest = hashlib.sha1(version.encode('utf-8'))
+    digest.update(encoding.encode('utf-8'))
+    digest.update(path.encode('utf-8'))
+    digest.update(build.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def enable(server, version, build=None):
+    """
+    Tag the Dash layout and dependencies of server with ETags and answer matching If-None-Match requests with 304 Not Modified. version is called for the data version the request is served from, and build, when given, once per process on the first tagged request for a string that changes with the code and settings the responses depend on (e.g. the serialized callback graph).
+    """
+    token = []
+
+    @server.before_request
+    def _check_etag():
+        if (flask.request.method != 'GET'
+                or not flask.request.path.endswith(PATHS)):
+            return None
+        if not token:
+            # Every callback is registered by the first request
+            token.append(hashlib.sha1(build().encode('utf-8')).hexdigest()
+                         if build is not None else '')
+        encoding = 'gzip' if 'gzip' in flask.request.headers.get(
+            'Accept-Encoding', '') else ''
+        tag = make(version(), flask.request.path, encoding, token[0])
+        if flask.request.if_none_match.contains(tag):
+            response = flask.Response(status=304)
+            response.set_etag(tag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        flask.g.etag = tag
+        return None
+
+    @server.after_request
+    def _set_etag(response):
+        tag = getattr(flask.g, 'etag', None)
+        if tag is not None and response.status_code == 200:
+            response.set_etag(tag)
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
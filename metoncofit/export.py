@@ -0,0 +1,160 @@
+"""
+MetOncoFit Interactive explorer export
+
+Download endpoint for the whole table or the rows behind the heatmaps of one view, as CSV or Parquet:
+
+    /export?format=csv
+    /export?cancer=Pan Cancer&target=Differential Expression&direction=up&genes=25&format=parquet
+
+direction can be repeated and defaults to all three, and genes (the top-N of each heatmap) defaults to every gene (it must be at least 1). The file is generated a chunk of rows at a time while it is sent, so an export never sits in worker memory in full. Neither format is among the types Flask-Compress compresses, which would buffer the response.
+@author: Scott Campit
+"""
+
+import io
+
+import flask
+import numpy as np
+
+import metoncofit.data
+
+# Rows per CSV chunk and Parquet row group
+CHUNK_ROWS = 50000
+
+# Genes looked up at a time for a view
+GENE_BATCH = 1000
+
+MIMETYPES = {'csv': 'text/csv', 'parquet': 'application/octet-stream'}
+
+
+class _Sink(io.RawIOBase):
+    """
+    Write-only file that hands over what has been written since the last call to take, while tell keeps counting from the start as the Parquet footer requires.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def positions(partitions, gene_rows, cancer=None, target=None,
+              directions=None, genes=None):
+    """
+    Chunks of positions in gene_rows of the rows to export: every row if cancer and target are None, otherwise the rows of the top genes of each direction of that view.
+    """
+    if cancer is None and target is None:
+        for start in range(0, len(gene_rows), CHUNK_ROWS):
+            yield np.arange(start, min(start + CHUNK_ROWS, len(gene_rows)))
+        return
+
+    views = partitions.get((cancer, target), {})
+    for nam in directions or list(metoncofit.data.DIRECTIONS):
+        part = views.get(nam)
+        if part is None:
+            continue
+        names = part.names[:genes]
+        for start in range(0, len(names), GENE_BATCH):
+            rows = gene_rows.select(names[start:start + GENE_BATCH], cancer,
+                                    target, metoncofit.data.DIRECTIONS[nam])
+            for i in range(0, len(rows), CHUNK_ROWS):
+                yield rows[i:i + CHUNK_ROWS]
+
+
+def frames(gene_rows, chunks):
+    """
+    A DataFrame per chunk of positions, and at least one, so an empty export still has its columns.
+    """
+    empty = True
+    for chunk in chunks:
+        if len(chunk):
+            empty = False
+            yield gene_rows.frame(chunk)
+    if empty:
+        yield gene_rows.frame(np.zeros(0, dtype=np.intp))
+
+
+def to_csv(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header)
+        header = False
+
+
+def to_parquet(frames):
+    """
+    Parquet file with a row group per frame, yielded as each row group is written.
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    sink = _Sink()
+    writer = None
+    for frame in frames:
+        table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pyarrow.parquet.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def _error(message):
+    return flask.Response(message + '\n', status=400, mimetype='text/plain')
+
+
+def enable(server, datasets, path='/export'):
+    """
+    Serve exports of the current table of datasets (a metoncofit.dataset.Manager) from the Flask server. A download keeps reading the version it started on.
+    """
+    def export():
+        dataset = datasets.current
+        partitions, gene_rows = dataset.partitions, dataset.gene_rows
+        args = flask.request.args
+        fmt = args.get('format', 'csv')
+        if fmt not in MIMETYPES:
+            return _error('format must be one of: ' + ', '.join(sorted(MIMETYPES)))
+        if fmt == 'parquet':
+            try:
+                import pyarrow.parquet
+            except ImportError:
+                return _error('Parquet export needs pyarrow')
+
+        cancer = args.get('cancer') or None
+        target = args.get('target') or None
+        directions = args.getlist('direction')
+        if (cancer is None) != (target is None):
+            return _error('cancer and target must be given together')
+        if cancer is not None and (cancer, target) not in partitions:
+            return _error('no data for {} / {}'.format(cancer, target))
+        if any(nam not in metoncofit.data.DIRECTIONS for nam in directions):
+            return _error('direction must be one of: '
+                          + ', '.join(sorted(metoncofit.data.DIRECTIONS)))
+        try:
+            genes = int(args['genes']) if args.get('genes') else None
+        except ValueError:
+            return _error('genes must be a number')
+        if genes is not None and genes < 1:
+            return _error('genes must be at least 1')
+
+        rows = frames(gene_rows, positions(partitions, gene_rows, cancer,
+                                           target, directions, genes))
+        body = to_parquet(rows) if fmt == 'parquet' else to_csv(rows)
+        return flask.Response(body, mimetype=MIMETYPES[fmt], headers={
+            'Content-Disposition': 'attachment; filename=metoncofit.{}'.format(fmt)})
+    server.add_url_rule(path, 'metoncofit_export', export)
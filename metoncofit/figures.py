@@ -0,0 +1,201 @@
+"""
+MetOncoFit Interactive explorer figures
+
+Figures for the heatmap callbacks, built as plain dicts. Plotly's graph objects validate every property on assignment, including each element of the x, y and z arrays, which costs more than building the figure; Dash serializes dicts the same way, so the callbacks skip them. Set METONCOFIT_VALIDATE_FIGURES=1 to check every figure against the Plotly schema while developing.
+@author: Scott Campit
+"""
+
+import math
+
+import numpy as np
+import plotly.graph_objs as go
+
+import metoncofit.config
+
+# Hover labels are formatted by plotly.js from the trace data, with R passed
+# as a customdata matrix the same shape as z
+hover_template = ('Gene: %{x}<br>Feature: %{y}<br>Value: %{z:.2f}'
+                  '<br>R: %{customdata:.2f}<extra></extra>')
+
+# Empty graph shown before a heatmap is filled in, or when it has no genes
+placeholder = {
+    'data': [],
+    'layout': {
+        'autosize': False,
+        'xaxis': {'visible': False},
+        'yaxis': {'visible': False}
+        }
+    }
+
+
+def validate(figure):
+    """
+    Check a figure against the Plotly schema, raising ValueError if any property is invalid.
+    """
+    go.Figure(figure)
+    return figure
+
+
+def _layout(title):
+    return {
+        'title': {
+            'text': '<b>'+title+'</b>',
+            'xanchor': 'left',
+            'yanchor': 'bottom',
+            'x': 0.47,
+            'font': {
+                'family': 'Arial',
+                'size': 16,
+                'color': 'black'
+                }
+            },
+        'autosize': False,
+        'yaxis': {
+            'automargin': True,
+            'autorange': 'reversed',
+            'tickfont': {
+                'family': 'Arial, sans-serif',
+                'size': 14,
+                'color': 'black'
+                }
+            }
+        }
+
+
+def _finish(figure, validated, cmap=None):
+    if cmap is not None:
+        # Left out otherwise, so plotly.js picks its default color scale
+        for trace in figure['data']:
+            trace['colorscale'] = cmap
+    if validated is None:
+        validated = metoncofit.config.VALIDATE_FIGURES
+    if validated:
+        validate(figure)
+    return figure
+
+
+def heatmap(matrix, label='', nam='type-heatmap', cmap=None,
+            validated=None):
+    """
+    Figure for one of the heatmap callbacks, from the dense matrices built by metoncofit.data.Partition.matrix. validated defaults to METONCOFIT_VALIDATE_FIGURES.
+    """
+    figure = {
+        'data': [{
+            'type': 'heatmap',
+            'x': matrix['x'],
+            'y': matrix['y'],
+            'z': matrix['z'],
+            'name': nam,
+            'customdata': matrix['customdata'],
+            'hovertemplate': hover_template
+            }],
+        'layout': _layout('Target label: '+label)
+        }
+    return _finish(figure, validated, cmap)
+
+
+def _members(genes):
+    if len(genes) <= 3:
+        return ', '.join(genes)
+    return '{}, {}, ... {} ({} genes)'.format(genes[0], genes[1], genes[-1],
+                                              len(genes))
+
+
+def binned_heatmap(binned, label='', nam='type-heatmap', cmap=None, how='mean',
+                   validated=None):
+    """
+    Figure for the level-of-detail mode, from the runs of genes built by metoncofit.data.bin_columns. The x axis is numeric, in gene columns of the full view, so the range of a zoom maps straight back to the genes it covers (see x_window); each run is labelled with its first gene and lists its genes on hover.
+    """
+    edges = binned['edges']
+    centers = (edges[:-1] + edges[1:] - 1) / 2.0
+    members = [_members(genes) for genes in binned['genes']]
+    if len(members) == edges[-1] - edges[0]:
+        # One gene per column
+        template = hover_template.replace('%{x}', '%{text}')
+    else:
+        template = ('Genes: %{text}<br>Feature: %{y}<br>'
+                    + '{} value: %{{z:.2f}}<br>Mean R: %{{customdata:.2f}}'
+                    '<extra></extra>'.format(how.capitalize()))
+
+    layout = _layout('Target label: '+label)
+    layout['xaxis'] = {'tickmode': 'array', 'tickvals': centers,
+                       'ticktext': [genes[0] for genes in binned['genes']]}
+    figure = {
+        'data': [{
+            'type': 'heatmap',
+            'x': edges - 0.5,
+            'y': binned['y'],
+            'z': binned['z'],
+            'text': [members] * len(binned['y']),
+            'name': nam,
+            'customdata': binned['customdata'],
+            'hovertemplate': template
+            }],
+        'layout': layout
+        }
+    return _finish(figure, validated, cmap)
+
+
+def profile(profile, cmap=None, validated=None):
+    """
+    Figure for the profile of one gene from metoncofit.data.GeneRows.profile: a cancers x features heatmap for each target, side by side on one color scale.
+    """
+    count = len(profile['targets'])
+    gap = 0.04
+    width = (1.0 - gap * (count - 1)) / count
+    z = profile['z']
+    finite = z[np.isfinite(z)]
+    zmin, zmax = ((float(finite.min()), float(finite.max())) if len(finite)
+                  else (0.0, 1.0))
+
+    layout = _layout('Gene: '+profile['gene'])
+    layout['title']['x'] = 0.0
+    data = []
+    for i, target in enumerate(profile['targets']):
+        axis = str(i + 1) if i else ''
+        data.append({
+            'type': 'heatmap',
+            'x': profile['features'],
+            'y': profile['cancers'],
+            'z': z[i],
+            'customdata': profile['customdata'][i],
+            'text': [[label] * len(profile['features'])
+                     for label in profile['type'][i]],
+            'xaxis': 'x'+axis,
+            'yaxis': 'y',
+            'name': target,
+            'zmin': zmin,
+            'zmax': zmax,
+            'showscale': i == count - 1,
+            'hovertemplate': ('Cancer: %{y}<br>Feature: %{x}<br>'
+                              + target + ': %{text}<br>Value: %{z:.2f}'
+                              '<br>R: %{customdata:.2f}<extra></extra>')
+            })
+        start = i * (width + gap)
+        layout['xaxis'+axis] = {'domain': [start, start + width],
+                                'title': {'text': target},
+                                'automargin': True}
+    return _finish({'data': data, 'layout': layout}, validated, cmap)
+
+
+def x_window(relayout):
+    """
+    Gene columns [start, stop) covered by the x range in a Graph's relayoutData, counted in columns of the full view. None when the x axis was reset to the full view, and False when the x range did not change.
+    """
+    relayout = relayout or {}
+    if 'xaxis.range[0]' in relayout:
+        lo, hi = relayout['xaxis.range[0]'], relayout.get('xaxis.range[1]')
+    elif 'xaxis.range' in relayout:
+        lo, hi = relayout['xaxis.range']
+    elif relayout.get('xaxis.autorange'):
+        return None
+    else:
+        return False
+    try:
+        start = max(0, int(math.floor(float(lo) + 0.5)))
+        stop = int(math.ceil(float(hi) + 0.5))
+    except (TypeError, ValueError):
+        return False
+    if stop <= start:
+        return False
+    return start, stop
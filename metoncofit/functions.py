@@ -9,7 +9,6 @@ import json
 
 from plotly import tools
 import chart_studio.plotly as py
-import plotly.graph_objs as go
 
 import dash
 from dash.dependencies import Input, Output
@@ -19,17 +18,23 @@ import dash_bootstrap_components as dbc
 
 import flask
 
+import metoncofit.data
+import metoncofit.figures
+
 df = pd.DataFrame()
 colormap = []
 
 
-def widget(data=df):
+def widget(data=df, updatemode='mouseup', summary=None):
     """
+    Slider and dropdowns. updatemode is passed to the gene slider. summary (see metoncofit.data.summary) replaces data when the table isn't loaded.
     """
     # get values that will be used
-    num_uniq_genes = data["Gene"].nunique()
-    cancer_type = data["Cancer"].unique()
-    prediction_type = data["Target"].unique()
+    if summary is None:
+        summary = metoncofit.data.summary(data)
+    num_uniq_genes = summary['genes']
+    cancer_type = summary['cancers']
+    prediction_type = summary['targets']
 
     widgets = dbc.Container(
         [
@@ -61,7 +66,7 @@ def widget(data=df):
                                 750: {'label': '750'},
                                 num_uniq_genes: {'label': str(num_uniq_genes)}
                                 },
-                            updatemode='drag'
+                            updatemode=updatemode
                             ),
                         style={'width': '50%', 'padding': '0px 20px 20px 20px'},
                         ),
@@ -90,6 +95,24 @@ def widget(data=df):
                             ),
                         width={"size": 3.0,
                                "offset": 0.3}
+                        ),
+
+                    # Gene search, with suggestions from metoncofit.search
+                    dbc.Col(
+                        html.Div(
+                            [
+                                dcc.Input(
+                                    id='gene-search',
+                                    type='text',
+                                    list='gene-suggestions',
+                                    placeholder='Search for a gene, then press Enter',
+                                    autoComplete='off',
+                                    style={'width': '100%'}
+                                    ),
+                                html.Datalist(id='gene-suggestions')
+                                ]
+                            ),
+                        width={"size": 2.0}
                         )
                     ]
                 )
@@ -98,45 +121,29 @@ def widget(data=df):
     return widgets
 
 
-def make_struct(hm_id='type-heatmap', data=df, nam='type', cmap=colormap):
+def export_links():
+    """
+    Links that download the rows behind the heatmaps (see metoncofit.export), pointed at the current selection in the browser.
+    """
+    return html.Div(
+        [
+            html.A('Download CSV', id='export-csv', href='/export?format=csv'),
+            ' | ',
+            html.A('Download Parquet', id='export-parquet',
+                   href='/export?format=parquet')
+            ],
+        style={'padding': '0px 20px 20px 20px'}
+        )
+
+
+def make_struct(hm_id='type-heatmap'):
     """
+    Graph for one heatmap. It starts as an empty placeholder; Dash fires the heatmap callback on page load, which fills it from the figure cache.
     """
     container = html.Div(
         dcc.Graph(
             id=hm_id,
-            figure={
-                'data': [(
-                    go.Heatmap(
-                        x=data['Gene'],
-                        y=data['Feature'],
-                        z=data['Value'],
-                        name=nam,
-                        colorscale=cmap)
-                    )],
-                'layout': go.Layout(
-                    title=go.layout.Title(
-                        text=('<b>Target label: '
-                              + data['Type'].iloc[0]+'</b>'),
-                        xanchor='right',
-                        yanchor='bottom',
-                        x=0,
-                        font=dict(
-                            family='Arial',
-                            size=16,
-                            color='black'
-                            )
-                        ),
-                    autosize=False,
-                    yaxis=dict(
-                        automargin=True,
-                        tickfont=dict(
-                            family='Arial, sans-serif',
-                            size=14,
-                            color='black'
-                            )
-                        )
-                    )
-                },
+            figure=metoncofit.figures.placeholder,
             config={
                 'displayModeBar': False
                 }
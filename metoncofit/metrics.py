@@ -0,0 +1,177 @@
+"""
+MetOncoFit Interactive explorer metrics
+
+Timers and counters for startup and the figure callbacks, served in the Prometheus text format at /metrics. Each worker process keeps its own numbers, so under gunicorn every scrape reports the worker that answered it; scrape the workers individually (or run a single worker) for complete counts.
+@author: Scott Campit
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+
+import flask
+
+# Upper bounds of the histogram buckets
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                1.0, 2.5, 5.0, 10.0)
+BYTE_BUCKETS = (1e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6, 1e7, 3e7)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, _escape(v)) for k, v in pairs) + '}'
+
+
+class _Metric(object):
+    kind = 'untyped'
+
+    def __init__(self, name, doc):
+        self.name = name
+        self.doc = doc
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self):
+        """
+        Copy of the current value of each series, keyed on its labels.
+        """
+        with self._lock:
+            return {key: value for key, value in self._series.items()}
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.doc),
+                 '# TYPE {} {}'.format(self.name, self.kind)]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return ['{}{} {}'.format(self.name, _labels(key), value)]
+
+
+class Counter(_Metric):
+    """
+    Monotonic count, per combination of labels.
+    """
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Last value set, per combination of labels.
+    """
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._series[tuple(sorted(labels.items()))] = value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """
+        Set the gauge to the duration of the block in seconds.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.set(time.time() - start, **labels)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values, per combination of labels.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, doc, buckets=TIME_BUCKETS):
+        super(Histogram, self).__init__(name, doc)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of the block in seconds.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, **labels)
+
+    def _render_series(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            lines.append('{}_bucket{} {}'.format(
+                self.name, _labels(key, [('le', bound)]), cumulative))
+        lines.append('{}_sum{} {}'.format(self.name, _labels(key), total))
+        lines.append('{}_count{} {}'.format(self.name, _labels(key), cumulative))
+        return lines
+
+
+STARTUP = Gauge('metoncofit_startup_seconds',
+                'Time spent in each stage of starting the app')
+CALLBACK = Histogram('metoncofit_callback_seconds',
+                     'Latency of the figure callbacks, cache hits included')
+STAGE = Histogram('metoncofit_stage_seconds',
+                  'Time spent in each stage of building a callback response')
+RESPONSE = Histogram('metoncofit_response_bytes',
+                     'Size of the serialized callback responses',
+                     buckets=BYTE_BUCKETS)
+CACHE = Counter('metoncofit_figure_cache_requests_total',
+                'Figure cache lookups, by result')
+RELOAD = Histogram('metoncofit_reload_seconds',
+                   'Time spent loading a new version of the dataset')
+RELOAD_STAGE = Gauge('metoncofit_reload_stage_seconds',
+                     'Time spent in each stage of the last dataset reload')
+RELOADS = Counter('metoncofit_reloads_total',
+                  'Dataset reloads, by result')
+
+
+def render():
+    """
+    Every registered metric in the Prometheus text format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def enable(server, path='/metrics'):
+    """
+    Serve the metrics from the Flask server.
+    """
+    def metrics():
+        return flask.Response(render(), mimetype='text/plain; version=0.0.4')
+    server.add_url_rule(path, 'metoncofit_metrics', metrics)
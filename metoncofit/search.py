@@ -0,0 +1,51 @@
+"""
+MetOncoFit Interactive explorer gene search
+
+The names of every gene in every cancer and target, sorted case-insensitively, so the genes starting with a prefix are one contiguous run found with two binary searches. Built once at startup and shared by all requests.
+@author: Scott Campit
+"""
+
+import bisect
+
+
+class GeneIndex(object):
+    """
+    Case-insensitive prefix index over gene names.
+    """
+
+    def __init__(self, names):
+        self.names = sorted(set(names), key=lambda name: (name.lower(), name))
+        self.keys = [name.lower() for name in self.names]
+
+    @classmethod
+    def from_partitions(cls, partitions):
+        """
+        Index the genes of every heatmap built by metoncofit.data.build_partitions or loaded by metoncofit.bundle.load.
+        """
+        return cls(name for views in partitions.values()
+                   for part in views.values() for name in part.names)
+
+    def suggest(self, prefix, limit=10):
+        """
+        Up to limit genes starting with prefix, in alphabetical order.
+        """
+        key = (prefix or '').strip().lower()
+        if not key:
+            return []
+        start = bisect.bisect_left(self.keys, key)
+        names = []
+        for i in range(start, min(start + limit, len(self.keys))):
+            if not self.keys[i].startswith(key):
+                break
+            names.append(self.names[i])
+        return names
+
+    def find(self, name):
+        """
+        The gene called name, ignoring case, or None.
+        """
+        key = (name or '').strip().lower()
+        i = bisect.bisect_left(self.keys, key)
+        if key and i < len(self.keys) and self.keys[i] == key:
+            return self.names[i]
+        return None
@@ -0,0 +1,122 @@
+"""
+MetOncoFit Interactive explorer shared dataset
+
+The heatmaps and the rows of each gene are written once per data version as a bundle (see metoncofit.bundle) under a shared directory (ideally on tmpfs such as /dev/shm), and every worker memory-maps it read-only instead of parsing db.json and building the indexes into its own copy. Under gunicorn with preload_app the master process does the export before forking; otherwise the first worker to start does.
+
+Exports are serialized by an exclusive lock per version, so when every worker's watcher sees a new db.json at once, one of them loads the table and writes the bundle while the others wait for it and map the result. Each process holds a shared lock on the version it serves for as long as it serves it. The directories of versions nobody holds any more, such as those left behind by a reload, are removed, as are the partial exports of processes killed while writing them, so the tmpfs only keeps the versions in use. Under gunicorn with preload_app, the master keeps the version it loaded mapped for the workers it forks later, so that one version stays until the master restarts.
+@author: Scott Campit
+"""
+
+import fcntl
+import os
+import shutil
+import tempfile
+
+import metoncofit.bundle
+import metoncofit.data
+
+LOCK = '.lock'
+EXPORT = '.export'
+TMP = '.tmp-'
+
+
+def load(path, directory):
+    """
+    Attach to the bundle for the current version of path under directory, exporting it first if no process has yet. Returns what metoncofit.bundle.load does and the open lock file that keeps the bundle from being removed until it is closed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = metoncofit.data.data_version(path)
+    bundle = os.path.join(directory, version)
+
+    # Taken before the export, so a cleanup in another process can't remove
+    # the bundle between its export and its use here
+    lock = hold(bundle + LOCK)
+    try:
+        if not os.path.exists(bundle):
+            # One process exports, the others wait here and then map its bundle
+            with hold(bundle + EXPORT, fcntl.LOCK_EX):
+                if not os.path.exists(bundle):
+                    export(metoncofit.data.load_table(path), version, bundle)
+        loaded = metoncofit.bundle.load(bundle)
+    except Exception:
+        lock.close()
+        raise
+    cleanup(directory)
+    return loaded, lock
+
+
+def hold(path, operation=fcntl.LOCK_SH):
+    """
+    The lock file at path, opened with a shared lock (or the given flock operation). A cleanup may remove the file between the open and the lock, so it is opened again until the lock is on the file at path.
+    """
+    while True:
+        lock = open(path, 'a')
+        fcntl.flock(lock, operation)
+        try:
+            if os.fstat(lock.fileno()).st_ino == os.stat(path).st_ino:
+                return lock
+        except OSError:
+            pass
+        lock.close()
+
+
+def export(data, version, bundle):
+    """
+    Write the bundle for a compacted table to the bundle directory. The bundle appears atomically, so concurrent exports are safe.
+    """
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(bundle),
+                           prefix=TMP + os.path.basename(bundle) + '-')
+    try:
+        metoncofit.bundle.write(data, version, tmp)
+        os.rename(tmp, bundle)
+    except OSError:
+        if not os.path.exists(bundle):
+            raise
+    finally:
+        if os.path.exists(tmp):
+            # Another process exported the same version first
+            shutil.rmtree(tmp)
+
+
+def _unused(path):
+    """
+    The lock file at path opened with an exclusive lock, or None if a process holds it.
+    """
+    lock = open(path, 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except (IOError, OSError):
+        lock.close()
+        return None
+    return lock
+
+
+def cleanup(directory):
+    """
+    Remove the bundles under directory that no process holds a lock on, and the partial exports no process is writing.
+    """
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(TMP):
+            # .tmp-<version>-<random>, left by a process killed mid-export
+            # unless the export lock of its version is still held
+            version = name[len(TMP):].rsplit('-', 1)[0]
+            lock = _unused(os.path.join(directory, version + EXPORT))
+            if lock is None:
+                continue
+            with lock:
+                shutil.rmtree(path, ignore_errors=True)
+                os.remove(lock.name)
+        elif name.endswith(LOCK):
+            lock = _unused(path)
+            if lock is None:
+                # Still in use
+                continue
+            with lock:
+                bundle = path[:-len(LOCK)]
+                shutil.rmtree(bundle, ignore_errors=True)
+                export = _unused(bundle + EXPORT)
+                if export is not None:
+                    with export:
+                        os.remove(export.name)
+                os.remove(path)
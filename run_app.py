@@ -14,7 +14,7 @@ import chart_studio.plotly as py
 import plotly.graph_objs as go
 
 import dash
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
@@ -23,26 +23,52 @@ import flask
 
 import metoncofit.static
 import metoncofit.functions
+import metoncofit.figures
 #import callbacks
 import metoncofit.col
+import metoncofit.data
+import metoncofit.dataset
+import metoncofit.export
+import metoncofit.api
+import metoncofit.cache
+import metoncofit.config
+import metoncofit.etag
+import metoncofit.metrics
 
 # Intialize the Flask/Dash application
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 app.title = 'MetOncoFit'
 
-# Read in data
-base = os.path.dirname(os.path.abspath(__file__))
-df = pd.read_json(base+'/data/db.json')
+# Serialized figures for the views visitors ask for most, built for the
+# most popular views before the first request comes in
+figure_cache = metoncofit.cache.FigureCache(
+    maxsize=metoncofit.config.CACHE_SIZE)
+
+
+# (callbacks, [cancer, target, genes] views) built by warm_cache, added by
+# the heatmap callbacks below
+warm_views = []
 
-# Create dataframes to parse data into three heat maps
-up = df.loc[(df["Type"] == "UPREGULATED") | (df["Type"] == "GAIN")]
-up = up.sort_values(by="Gini", ascending=False)
 
-neut = df.loc[(df["Type"] == "NEUTRAL") | (df["Type"] == "NEUT")]
-neut = neut.sort_values(by="Gini", ascending=False)
+def warm_cache(dataset):
+    """
+    Build the figures of the most popular views for dataset before it is served. The figures of the version being served are kept until dataset replaces it.
+    """
+    figure_cache.prune(datasets.latest.version, dataset.version)
+    with datasets.pinned(dataset):
+        for callbacks, keys in warm_views:
+            metoncofit.cache.warm(callbacks, keys)
 
-down = df.loc[(df["Type"] == "DOWNREGULATED") | (df["Type"] == "LOSS")]
-down = down.sort_values(by="Gini", ascending=False)
+
+# Read in data: the heatmap views, the rows of each gene and the gene search
+# index, reloaded in the background and swapped in when db.json changes
+base = os.path.dirname(os.path.abspath(__file__))
+db = metoncofit.config.DATA or base+'/data/db.json'
+datasets = metoncofit.dataset.Manager(
+    db, bundle=metoncofit.config.BUNDLE or base+'/data/bundle',
+    prepare=warm_cache,
+    swapped=lambda dataset: figure_cache.prune(dataset.version))
+datasets.watch(metoncofit.config.RELOAD_INTERVAL)
 
 colormap = metoncofit.col.Choose_Gradient('red')
 
@@ -50,208 +76,295 @@ colormap = metoncofit.col.Choose_Gradient('red')
 _body = metoncofit.static.header()
 
 # Create dynamic parts that will allow client to interact with data
-_widgets = metoncofit.functions.widget(data=df)
-
-up_heatmap = metoncofit.functions.make_struct(
-    hm_id='up-heatmap', data=up, nam='up', cmap=colormap)
-neut_heatmap = metoncofit.functions.make_struct(
-    hm_id='neut-heatmap', data=neut, nam='neut', cmap=colormap)
-down_heatmap = metoncofit.functions.make_struct(
-    hm_id='down-heatmap', data=down, nam='down', cmap=colormap)
-
-# Initialize the application
-app.layout = html.Div(
-                      [_body,
-                       _widgets,
-                       up_heatmap,
-                       neut_heatmap,
-                       down_heatmap
-                       ]
-                      )
-
-
-@app.callback(
-    dash.dependencies.Output('up-heatmap', 'figure'),
-    [dash.dependencies.Input('cancer-type', 'value'),
-     dash.dependencies.Input('prediction-type', 'value'),
-     dash.dependencies.Input('gene-slider', 'value')])
-def update_up(cancer_choice, prediction_choice, slider_choice):
-    up_df = up[up['Target'] == prediction_choice]
-    up_df = up_df[up_df['Cancer'] == cancer_choice]
-    up_tmp = up_df['Gene'].unique().tolist()
-    up_tmp = up_tmp[0:slider_choice]
-    up_df = up_df.loc[up_df['Gene'].isin(up_tmp)]
-    up_df = up_df.sort_values(['Gini', 'Value'], ascending=False)
-
-    custom_hover = []
-    for _, i in up_df.iterrows():
-        dat = 'Gene: '+'{}'.format(i['Gene'])+'<br>'+'Feature: '+'{}'.format(i['Feature']) + \
-                                   '<br>'+'Value: ' + \
-                                       '{0:.2f}'.format(
-                                           i['Value'])+'<br>'+'R: '+'{0:.2f}'.format(i['R'])
-        custom_hover.append(dat)
-
-    return {
-        'data': [(
-            go.Heatmap(
-                x=up_df['Gene'],
-                y=up_df['Feature'],
-                z=up_df['Value'],
-                name='up-heatmap',
-                colorscale=colormap,
-                text=custom_hover,
-                hoverinfo='text')
-                )],
-        'layout': go.Layout(
-            title=go.layout.Title(
-                text=('<b>Target label: '+up_df['Type'].iloc[0]+'</b>'),
-                xanchor='left',
-                yanchor='bottom',
-                x=0.47,
-                font=dict(
-                    family='Arial',
-                    size=16,
-                    color='black'
-                    )
-                ),
-            autosize=False,
-            yaxis=dict(
-                automargin=True,
-                autorange='reversed',
-                tickfont=dict(
-                    family='Arial, sans-serif',
-                    size=14,
-                    color='black',
+client_slider = metoncofit.config.SLIDER_MODE == 'client'
+
+# Downloads of the selected view
+_export = metoncofit.functions.export_links()
+
+# Empty graphs, filled in by the heatmap callbacks when the page loads
+up_heatmap = metoncofit.functions.make_struct(hm_id='up-heatmap')
+neut_heatmap = metoncofit.functions.make_struct(hm_id='neut-heatmap')
+down_heatmap = metoncofit.functions.make_struct(hm_id='down-heatmap')
+
+# The searched gene across every cancer and target
+profile_heatmap = metoncofit.functions.make_struct(hm_id='profile-heatmap')
+
+# Views of the selected cancer and target, in the 'client' slider mode
+_store = dcc.Store(id='heatmap-store')
+
+def serve_layout():
+    """
+    Page for the current dataset, whose cancers, targets and number of genes fill the widgets.
+    """
+    _widgets = metoncofit.functions.widget(
+        summary=datasets.current.summary,
+        updatemode='drag' if client_slider else metoncofit.config.SLIDER_MODE)
+    return html.Div(
+                    [_body,
+                     _widgets,
+                     _export,
+                     up_heatmap,
+                     neut_heatmap,
+                     down_heatmap,
+                     profile_heatmap,
+                     _store
+                     ]
                     )
-                )
-            )
-        }
 
 
-@app.callback(
-    dash.dependencies.Output('neut-heatmap', 'figure'),
-    [dash.dependencies.Input('cancer-type', 'value'),
-     dash.dependencies.Input('prediction-type', 'value'),
-     dash.dependencies.Input('gene-slider', 'value')])
-def update_neut(cancer_choice, prediction_choice, slider_choice):
-    neut_df = neut[neut['Target'] == prediction_choice]
-    neut_df = neut_df[neut_df['Cancer'] == cancer_choice]
-    neut_tmp = neut_df['Gene'].unique().tolist()
-    neut_tmp = neut_tmp[0:slider_choice]
-    neut_df = neut_df.loc[neut_df['Gene'].isin(neut_tmp)]
-    neut_df = neut_df.sort_values(['Gini', 'Value'], ascending=False)
-
-    custom_hover = []
-    for _, i in neut_df.iterrows():
-        dat = 'Gene: '+'{}'.format(i['Gene'])+'<br>'+'Feature: '+'{}'.format(i['Feature']) + \
-                                   '<br>'+'Value: ' + \
-                                       '{0:.2f}'.format(
-                                           i['Value'])+'<br>'+'R: '+'{0:.2f}'.format(i['R'])
-        custom_hover.append(dat)
-
-    return {
-        'data': [(
-            go.Heatmap(
-                x=neut_df['Gene'],
-                y=neut_df['Feature'],
-                z=neut_df['Value'],
-                name='neut-heatmap',
-                colorscale=colormap,
-                text=custom_hover,
-                hoverinfo='text')
-                )],
-        'layout': go.Layout(
-            title=go.layout.Title(
-                text=('<b>Target label: '+neut_df['Type'].iloc[0]+'</b>'),
-                xanchor='left',
-                yanchor='bottom',
-                x=0.47,
-                font=dict(
-                    family='Arial',
-                    size=16,
-                    color='black'
-                    )
-                ),
-            autosize=False,
-            yaxis=dict(
-                automargin=True,
-                autorange='reversed',
-                tickfont=dict(
-                    family='Arial, sans-serif',
-                    size=14,
-                    color='black',
-                    )
-                )
-            )
-        }
+# Initialize the application
+app.layout = serve_layout
+
+# Each request reads the dataset that was current when it came in, so the
+# ones in flight when a new version is swapped in finish on the old one
+datasets.enable(app.server, token=metoncofit.config.RELOAD_TOKEN,
+                marker=metoncofit.config.RELOAD_MARKER)
+
+
+def page_build():
+    """
+    What the layout and the callback graph depend on besides the data: the registered callbacks, the settings that shape the widgets and the Dash version.
+    """
+    callbacks = [[output, spec['inputs'], spec['state'],
+                  spec.get('clientside_function')]
+                 for output, spec in sorted(app.callback_map.items())]
+    settings = [metoncofit.config.SLIDER_MODE, metoncofit.config.LOD_COLUMNS,
+                metoncofit.config.LOD_AGGREGATE]
+    return json.dumps([callbacks, settings, dash.__version__], sort_keys=True)
+
+
+# Dash already gzips responses through Flask-Compress. Tag the layout and the
+# callback graph with ETags derived from the data version and the build so
+# browsers can revalidate them.
+app.server.config.update(
+    COMPRESS_LEVEL=metoncofit.config.COMPRESS_LEVEL,
+    COMPRESS_MIN_SIZE=metoncofit.config.COMPRESS_MIN_SIZE)
+metoncofit.etag.enable(app.server, lambda: datasets.current.version,
+                       build=page_build)
+
+# Prometheus-style timings, cache counts and payload sizes
+if metoncofit.config.METRICS:
+    metoncofit.metrics.enable(app.server)
+
+# CSV and Parquet downloads, streamed from the rows grouped by gene
+metoncofit.export.enable(app.server, datasets)
+
+# JSON query API for pipelines, under /api/v1 (see metoncofit/api.py)
+metoncofit.api.enable(app.server, datasets)
+
+
+def data_version():
+    """
+    Version of the dataset the request is served from, part of every figure cache key.
+    """
+    return datasets.current.version
+
+
+def known_views():
+    """
+    The (cancer, target) views with data, the only ones recorded as metric labels.
+    """
+    return datasets.current.partitions
+
+
+# A search is applied when it is submitted with Enter or the box loses focus;
+# only the suggestions follow every keystroke
+search_inputs = [dash.dependencies.Input('gene-search', 'n_submit'),
+                 dash.dependencies.Input('gene-search', 'n_blur')]
+search_state = dash.dependencies.State('gene-search', 'value')
+
+heatmap_outputs = [dash.dependencies.Output('up-heatmap', 'figure'),
+                   dash.dependencies.Output('neut-heatmap', 'figure'),
+                   dash.dependencies.Output('down-heatmap', 'figure')]
+
+if client_slider:
+    @metoncofit.cache.cached_callback(
+        app, figure_cache,
+        dash.dependencies.Output('heatmap-store', 'data'),
+        [dash.dependencies.Input('cancer-type', 'value'),
+         dash.dependencies.Input('prediction-type', 'value')],
+        labels=('cancer', 'target'), version=data_version,
+        known=known_views)
+    def update_store(cancer_choice, prediction_choice):
+        views = datasets.current.partitions.get(
+            (cancer_choice, prediction_choice))
+        if views is None:
+            # Placeholders in the browser, rather than the previous views
+            return {}
+
+        store = {}
+        for nam, part in views.items():
+            with metoncofit.metrics.STAGE.time(stage='select'):
+                matrix = part.ranked()
+            with metoncofit.metrics.STAGE.time(stage='figure'):
+                store[nam] = {
+                    'figure': metoncofit.figures.heatmap(
+                        matrix=matrix, label=part.label,
+                        nam=nam+'-heatmap', cmap=colormap),
+                    'rank': matrix['rank'],
+                    'position': matrix['position']
+                    }
+        return store
+
+    # Slider changes only slice the stored views (see assets/metoncofit.js)
+    app.clientside_callback(
+        ClientsideFunction('metoncofit', 'heatmaps'),
+        heatmap_outputs,
+        [dash.dependencies.Input('gene-slider', 'value'),
+         dash.dependencies.Input('heatmap-store', 'data')] + search_inputs,
+        [search_state])
+
+    warm_views.append(([update_store],
+                       [key[:2] for key in metoncofit.config.CACHE_WARM]))
+else:
+    heatmap_inputs = [dash.dependencies.Input('cancer-type', 'value'),
+                      dash.dependencies.Input('prediction-type', 'value'),
+                      dash.dependencies.Input('gene-slider', 'value')
+                      ] + search_inputs
+    lod_columns = metoncofit.config.LOD_COLUMNS
+    if lod_columns:
+        # Zooming into a binned heatmap fetches the genes in the zoomed range
+        heatmap_inputs += [dash.dependencies.Input(nam+'-heatmap', 'relayoutData')
+                           for nam in ('up', 'neut', 'down')]
+
+    def heatmap_view(cancer_choice, prediction_choice, slider_choice,
+                     submitted=None, blurred=None, *layouts_and_search):
+        """
+        The view, the searched gene if the search box holds a gene's name, and the zoomed gene columns of each heatmap: None for all of them, or False to leave a heatmap as it is while another one is zoomed. Changing the view resets every zoom.
+        """
+        layouts = layouts_and_search[:-1]
+        search = layouts_and_search[-1] if layouts_and_search else None
+        triggered = ([t['prop_id'] for t in dash.callback_context.triggered]
+                     if flask.has_request_context() else [])
+        windows = [None, None, None]
+        if layouts and triggered and all(
+                t.endswith('.relayoutData') for t in triggered):
+            windows = [metoncofit.figures.x_window(layout)
+                       if nam+'-heatmap.relayoutData' in triggered else False
+                       for nam, layout in zip(('up', 'neut', 'down'), layouts)]
+        return [cancer_choice, prediction_choice, slider_choice,
+                datasets.current.gene_index.find(search)] + windows
+
+    @metoncofit.cache.cached_callback(
+        app, figure_cache, heatmap_outputs, heatmap_inputs, [search_state],
+        labels=('cancer', 'target'), key=heatmap_view, version=data_version,
+        known=known_views)
+    def update_heatmaps(cancer_choice, prediction_choice, slider_choice,
+                        gene, *windows):
+        views = datasets.current.partitions.get(
+            (cancer_choice, prediction_choice))
+        if views is None:
+            # Nothing for this selection, rather than the previous one's figures
+            return [metoncofit.figures.placeholder] * 3
+
+        if gene is not None:
+            # Just the searched gene, in the heatmaps that have it
+            with metoncofit.metrics.STAGE.time(stage='select'):
+                found = {nam: part.gene(gene) for nam, part in views.items()}
+            if any(matrix is not None for matrix in found.values()):
+                figures = []
+                for nam, window in zip(('up', 'neut', 'down'), windows):
+                    matrix = found.get(nam)
+                    if window is not None:
+                        # plotly.js zooms into a single gene by itself, and
+                        # the other heatmaps are left as they are
+                        figures.append(dash.no_update)
+                        continue
+                    if matrix is None:
+                        figures.append(metoncofit.figures.placeholder)
+                        continue
+                    with metoncofit.metrics.STAGE.time(stage='figure'):
+                        figures.append(metoncofit.figures.heatmap(
+                            matrix=matrix, label=views[nam].label,
+                            nam=nam+'-heatmap', cmap=colormap))
+                return figures
+
+        figures = []
+        for nam, window in zip(('up', 'neut', 'down'), windows):
+            part = views.get(nam)
+            if window is False:
+                # Another heatmap was zoomed
+                figures.append(dash.no_update)
+                continue
+            if part is None:
+                figures.append(metoncofit.figures.placeholder)
+                continue
+            size = min(slider_choice, len(part.genes))
+            lod = lod_columns and size > lod_columns
+            if window is not None and not lod:
+                # plotly.js zooms into a heatmap with every gene by itself
+                figures.append(dash.no_update)
+                continue
+            with metoncofit.metrics.STAGE.time(stage='select'):
+                matrix = part.matrix(size)
+                if lod:
+                    start, stop = window or (0, size)
+                    start = min(start, size - 1)
+                    matrix = metoncofit.data.bin_columns(
+                        matrix, start, min(stop, size), lod_columns,
+                        metoncofit.config.LOD_AGGREGATE)
+            with metoncofit.metrics.STAGE.time(stage='figure'):
+                if lod:
+                    figures.append(metoncofit.figures.binned_heatmap(
+                        binned=matrix, label=part.label, nam=nam+'-heatmap',
+                        cmap=colormap, how=metoncofit.config.LOD_AGGREGATE))
+                else:
+                    figures.append(metoncofit.figures.heatmap(
+                        matrix=matrix, label=part.label,
+                        nam=nam+'-heatmap', cmap=colormap))
+        return figures
+
+    warm_views.append(([update_heatmaps], metoncofit.config.CACHE_WARM))
+
+with metoncofit.metrics.STARTUP.time(stage='warm'):
+    warm_cache(datasets.current)
+
+
+@metoncofit.cache.cached_callback(
+    app, figure_cache,
+    dash.dependencies.Output('profile-heatmap', 'figure'),
+    search_inputs, [search_state],
+    key=lambda submitted, blurred, search: [
+        datasets.current.gene_index.find(search)],
+    version=data_version)
+def update_profile(gene):
+    with metoncofit.metrics.STAGE.time(stage='select'):
+        profile = (datasets.current.gene_rows.profile(gene)
+                   if gene is not None else None)
+    if profile is None:
+        return metoncofit.figures.placeholder
+    with metoncofit.metrics.STAGE.time(stage='figure'):
+        return metoncofit.figures.profile(profile, cmap=colormap)
 
 
 @app.callback(
-    dash.dependencies.Output('down-heatmap', 'figure'),
+    dash.dependencies.Output('gene-suggestions', 'children'),
+    [dash.dependencies.Input('gene-search', 'value')])
+def suggest_genes(search):
+    with metoncofit.metrics.CALLBACK.time(callback='suggest_genes'):
+        return [html.Option(value=name) for name in
+                datasets.current.gene_index.suggest(search)]
+
+
+# Export links follow the selection, in the browser as well
+app.clientside_callback(
+    ClientsideFunction('metoncofit', 'export_links'),
+    [dash.dependencies.Output('export-csv', 'href'),
+     dash.dependencies.Output('export-parquet', 'href')],
     [dash.dependencies.Input('cancer-type', 'value'),
      dash.dependencies.Input('prediction-type', 'value'),
      dash.dependencies.Input('gene-slider', 'value')])
-def update_down(cancer_choice, prediction_choice, slider_choice):
-    down_df = down[down['Target'] == prediction_choice]
-    down_df = down_df[down_df['Cancer'] == cancer_choice]
-    down_tmp = down_df['Gene'].unique().tolist()
-    down_tmp = down_tmp[0:slider_choice]
-    down_df = down_df.loc[down_df['Gene'].isin(down_tmp)]
-    down_df = down_df.sort_values(['Gini', 'Value'], ascending=False)
-
-    custom_hover = []
-    for _, i in down_df.iterrows():
-        dat = 'Gene: '+'{}'.format(i['Gene'])+'<br>'+'Feature: '+'{}'.format(i['Feature']) + \
-                                   '<br>'+'Value: ' + \
-                                       '{0:.2f}'.format(
-                                           i['Value'])+'<br>'+'R: '+'{0:.2f}'.format(i['R'])
-        custom_hover.append(dat)
-
-    return {
-        'data': [(
-            go.Heatmap(
-                x=down_df['Gene'],
-                y=down_df['Feature'],
-                z=down_df['Value'],
-                name='down-heatmap',
-                colorscale=colormap,
-                text=custom_hover,
-                hoverinfo='text')
-                )],
-        'layout': go.Layout(
-            title=go.layout.Title(
-                text=('<b>Target label: '+down_df['Type'].iloc[0]+'</b>'),
-                xanchor='left',
-                yanchor='bottom',
-                x=0.47,
-                font=dict(
-                    family='Arial',
-                    size=16,
-                    color='black'
-                    )
-                ),
-            autosize=False,
-            yaxis=dict(
-                automargin=True,
-                autorange='reversed',
-                tickfont=dict(
-                    family='Arial, sans-serif',
-                    size=14,
-                    color='black',
-                    )
-                )
-            )
-        }
 
-    # Callback for the slider
-    @app.callback(Output('updatemode-output-container', 'children'),
-                  [dash.dependencies.Input('gene-slider', 'value')])
-    def display_value(value):
-            return 'Number of genes displayed: {}'.format(value, value)
+# Callback for the slider, run in the browser (see assets/metoncofit.js)
+app.clientside_callback(
+    ClientsideFunction('metoncofit', 'gene_count'),
+    dash.dependencies.Output('updatemode-output-container', 'children'),
+    [dash.dependencies.Input('gene-slider', 'value')])
 
-# For server
-#server = app.server
+# WSGI entry point, e.g. `gunicorn -c gunicorn.conf.py run_app:server`
+server = app.server
 
 
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    app.run_server(host=metoncofit.config.HOST, port=metoncofit.config.PORT,
+                   debug=metoncofit.config.DEBUG)
@@ -0,0 +1,79 @@
+"""
+Shared fixtures for the MetOncoFit explorer tests
+
+A small synthetic db.json in the layout of the real one. Gini is set per feature and Value is rounded, so genes tie on both and the order of the heatmaps depends on every tie-break; about one gene-feature pair in five is missing, so the heatmaps have empty cells.
+@author: Scott Campit
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import metoncofit.config
+import metoncofit.data
+
+CANCERS = ['Pan Cancer', 'Breast', 'Lung']
+TARGETS = [('Differential Expression', ['UPREGULATED', 'NEUTRAL', 'DOWNREGULATED']),
+           ('Copy Number Variation', ['GAIN', 'NEUT', 'LOSS'])]
+
+
+def synthetic(genes=40, features=6, seed=0):
+    """
+    A table with the columns of db.json, in no particular order.
+    """
+    rng = np.random.RandomState(seed)
+    rows = []
+    for cancer in CANCERS:
+        for target, types in TARGETS:
+            gini = rng.choice([0.2, 0.5, 0.8], features)
+            for gene in range(genes):
+                kind = types[rng.randint(len(types))]
+                for feature in range(features):
+                    if rng.rand() < 0.2:
+                        continue
+                    rows.append({'Gene': 'G{:03d}'.format(gene),
+                                 'Feature': 'Feature {}'.format(feature),
+                                 'Value': round(rng.rand(), 1),
+                                 'R': rng.uniform(-1, 1),
+                                 'Gini': gini[feature],
+                                 'Cancer': cancer,
+                                 'Target': target,
+                                 'Type': kind})
+    data = pd.DataFrame(rows, columns=metoncofit.data.COLUMNS)
+    return data.sample(frac=1, random_state=rng).reset_index(drop=True)
+
+
+def write_db(path, seed=0, **kwargs):
+    synthetic(seed=seed, **kwargs).to_json(str(path))
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def no_shared_dir(monkeypatch):
+    # Datasets are loaded into each test's own process memory
+    monkeypatch.setattr(metoncofit.config, 'SHARED_DIR', None)
+
+
+@pytest.fixture
+def db(tmp_path):
+    return write_db(tmp_path / 'db.json')
+
+
+@pytest.fixture
+def table(db):
+    return metoncofit.data.load_table(db)
+
+
+@pytest.fixture
+def directions(table):
+    return metoncofit.data.direction_rows(table)
+
+
+@pytest.fixture
+def partitions(table, directions):
+    return metoncofit.data.build_partitions(table, directions)
+
+
+@pytest.fixture
+def gene_rows(table):
+    return metoncofit.data.GeneRows.from_table(table)
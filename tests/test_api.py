@@ -0,0 +1,73 @@
+"""
+Tests for the paging and validation of metoncofit.api
+@author: Scott Campit
+"""
+
+import pytest
+
+import metoncofit.api
+
+
+def pages(gene_rows, limit, **params):
+    """
+    Every page of a query, following the cursors.
+    """
+    cursor = None
+    while True:
+        page = metoncofit.api.query(gene_rows, 'v', limit=limit, cursor=cursor,
+                                    **params)
+        yield page['rows']
+        cursor = page['next']
+        if cursor is None:
+            return
+
+
+@pytest.mark.parametrize('scan', [1, 7, 50000])
+@pytest.mark.parametrize('limit', [1, 5, 13])
+def test_cursor_paging(monkeypatch, gene_rows, scan, limit):
+    # Small scans make the pages straddle the chunks of candidate rows
+    monkeypatch.setattr(metoncofit.api, 'SCAN_ROWS', scan)
+    queries = [{'cancer': 'Breast', 'target': 'Copy Number Variation', 'type': 'up'},
+               {'gene': 'G001,G017', 'cancer': 'Lung'},
+               {'gene': ['G003'], 'feature': ['Feature 1', 'Feature 4']}]
+    for params in queries:
+        expected = metoncofit.api.query(gene_rows, 'v', limit=10000, **params)
+        assert expected['next'] is None and expected['rows']
+        got = list(pages(gene_rows, limit, **params))
+        assert all(0 < len(rows) <= limit for rows in got)
+        assert [row for rows in got for row in rows] == expected['rows']
+
+
+def test_filters(table, gene_rows):
+    rows = metoncofit.api.query(gene_rows, 'v', cancer='Breast',
+                                target='Copy Number Variation', type=['up'],
+                                limit=10000)['rows']
+    data = table[(table['Cancer'] == 'Breast')
+                 & (table['Target'] == 'Copy Number Variation')
+                 & (table['Type'] == 'GAIN')]
+    assert len(rows) == len(data)
+    assert [row['Gene'] for row in rows] == sorted(row['Gene'] for row in rows)
+
+
+def test_cursor_version(gene_rows):
+    page = metoncofit.api.query(gene_rows, 'v', gene='G001', limit=1)
+    with pytest.raises(metoncofit.api.QueryError):
+        metoncofit.api.query(gene_rows, 'w', gene='G001', cursor=page['next'])
+    with pytest.raises(metoncofit.api.QueryError):
+        metoncofit.api.query(gene_rows, 'v', gene='G001', cursor='???')
+
+
+@pytest.mark.parametrize('params', [
+    {},
+    {'cancer': 'Breast'},
+    {'gene': 'G001', 'limit': 0},
+    {'gene': 'G001', 'limit': 'ten'},
+    {'gene': 'G001', 'limit': True},
+    {'gene': 'G001', 'cursor': 5},
+    {'gene': [1]},
+    {'gene': 'G001', 'type': {'up': 1}},
+    {'cancer': ['Breast'], 'target': 'Copy Number Variation'},
+    ])
+def test_invalid(gene_rows, params):
+    with pytest.raises(metoncofit.api.QueryError):
+        metoncofit.api.query(gene_rows, 'v', **params)
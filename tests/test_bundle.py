@@ -0,0 +1,50 @@
+"""
+Tests for metoncofit.bundle
+@author: Scott Campit
+"""
+
+import os
+
+import numpy as np
+
+import metoncofit.bundle
+import metoncofit.data
+
+from conftest import write_db
+
+COUNTS = [1, 2, 3, 7, 20, 1000]
+
+
+def test_bundle_order(tmp_path, table, partitions):
+    metoncofit.bundle.write(table, 'v', str(tmp_path))
+    views, _, _, version = metoncofit.bundle.load(str(tmp_path))
+    assert version == 'v'
+    assert sorted(views) == sorted(partitions)
+    for view, parts in partitions.items():
+        for nam, part in parts.items():
+            for n in COUNTS:
+                want, got = part.matrix(n), views[view][nam].matrix(n)
+                for key in ('x', 'y', 'z', 'customdata', 'rank', 'position'):
+                    np.testing.assert_array_equal(np.asarray(got[key]),
+                                                  np.asarray(want[key]))
+
+
+def test_build_swaps_symlink(tmp_path, db):
+    dest = str(tmp_path / 'bundle')
+    metoncofit.bundle.build(db, dest)
+    first = os.path.realpath(dest)
+    assert os.path.islink(dest)
+    assert metoncofit.bundle.load(dest, db)[3] == metoncofit.data.data_version(db)
+
+    # A new build replaces the link and removes the previous one
+    metoncofit.bundle.build(db, dest)
+    assert os.path.realpath(dest) != first
+    assert not os.path.exists(first)
+    assert metoncofit.bundle.load(dest, db) is not None
+
+
+def test_load_stale(tmp_path, db):
+    dest = str(tmp_path / 'bundle')
+    metoncofit.bundle.build(db, dest)
+    write_db(db, seed=1)
+    assert metoncofit.bundle.load(dest, db) is None
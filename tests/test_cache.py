@@ -0,0 +1,74 @@
+"""
+Tests for metoncofit.cache
+@author: Scott Campit
+"""
+
+import dash
+import dash.dependencies
+
+import metoncofit.cache
+import metoncofit.metrics
+
+
+def test_lru_eviction():
+    cache = metoncofit.cache.FigureCache(maxsize=2)
+    built = []
+
+    def get(key):
+        return cache.get(key, lambda: built.append(key) or key.encode('ascii'))
+
+    assert get('a') == b'a' and get('b') == b'b'
+    # A hit makes a the most recently used, so c evicts b
+    assert get('a') == b'a'
+    get('c')
+    assert built == ['a', 'b', 'c']
+    get('a')
+    get('b')
+    assert built == ['a', 'b', 'c', 'b']
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 2, 'misses': 4}
+
+    cache.clear()
+    assert cache.stats()['size'] == 0
+
+
+def test_prune_rejects_stale_inserts():
+    cache = metoncofit.cache.FigureCache()
+    cache.get(('v1', 'a'), lambda: b'old')
+    cache.get(('v2', 'a'), lambda: b'new')
+
+    # v3 is being prepared while v2 is served
+    cache.prune('v2', 'v3')
+    assert cache.stats()['size'] == 1
+    assert cache.get(('v2', 'a'), lambda: b'rebuilt') == b'new'
+
+    # A request still in flight on v1 gets its figure, which isn't stored
+    assert cache.get(('v1', 'a'), lambda: b'late') == b'late'
+    assert cache.get(('v3', 'a'), lambda: b'next') == b'next'
+    assert cache.stats()['size'] == 2
+    assert cache.get(('v1', 'a'), lambda: b'again') == b'again'
+
+
+def test_metric_labels_bounded():
+    app = dash.Dash(__name__)
+    # No layout to check the callback against
+    app.config.suppress_callback_exceptions = True
+
+    @metoncofit.cache.cached_callback(
+        app, metoncofit.cache.FigureCache(),
+        dash.dependencies.Output('figure', 'children'),
+        [dash.dependencies.Input('cancer', 'value'),
+         dash.dependencies.Input('target', 'value')],
+        labels=('cancer', 'target'), known=lambda: {('Breast', 'CNV')})
+    def labelled_view(cancer, target):
+        return '{} {}'.format(cancer, target)
+
+    labelled_view('Breast', 'CNV')
+    for cancer in ('<script>', 'x' * 1000, 'Lung'):
+        labelled_view(cancer, 'CNV')
+
+    # Unknown values, whatever they are, share one series
+    counts = {(dict(key)['cancer'], dict(key)['target']): sum(value[0])
+              for key, value in metoncofit.metrics.CALLBACK.samples().items()
+              if dict(key)['callback'] == 'labelled_view'}
+    other = metoncofit.cache.OTHER
+    assert counts == {('Breast', 'CNV'): 1, (other, other): 3}
@@ -0,0 +1,153 @@
+"""
+Tests for the heatmap order of metoncofit.data and assets/metoncofit.js, and for bin_columns and GeneRows
+@author: Scott Campit
+"""
+
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import metoncofit.cache
+import metoncofit.data
+import metoncofit.figures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COUNTS = [1, 2, 3, 7, 20, 1000]
+
+
+def expected(table, rows, n):
+    """
+    The heatmap of the first n genes of a (Cancer, Target, direction) group, straight from its definition: genes ranked by first appearance in rows (the Gini sort of direction_rows), cells in display order (Gini, then Value, descending, ties kept in the order of rows), and columns and features in the order they first appear in display order.
+    """
+    gene = table['Gene'].astype(str).values
+    feature = table['Feature'].astype(str).values
+    gini = table['Gini'].values
+    value = table['Value'].values
+
+    top = set(pd.unique(gene[rows])[:n])
+    display = sorted(rows, key=lambda row: (-gini[row], -value[row]))
+    shown = [row for row in display if gene[row] in top]
+    x = list(pd.unique(gene[shown]))
+    y = list(pd.unique(feature[shown]))
+    z = np.full((len(y), len(x)), np.nan, dtype=np.float32)
+    for row in shown:
+        z[y.index(feature[row]), x.index(gene[row])] = value[row]
+    return x, y, z
+
+
+def groups(table, directions):
+    for nam, rows in directions.items():
+        cancer = table['Cancer'].astype(str).values[rows]
+        target = table['Target'].astype(str).values[rows]
+        for view in sorted(set(zip(cancer, target))):
+            yield view, nam, rows[(cancer == view[0]) & (target == view[1])]
+
+
+def test_partition_order(table, directions, partitions):
+    for view, nam, rows in groups(table, directions):
+        part = partitions[view][nam]
+        for n in COUNTS:
+            x, y, z = expected(table, rows, n)
+            matrix = part.matrix(n)
+            assert list(matrix['x']) == x
+            assert list(matrix['y']) == y
+            np.testing.assert_array_equal(matrix['z'], z)
+
+
+SLICE = """
+global.window = {};
+require(process.argv[1]);
+const input = JSON.parse(require('fs').readFileSync(0));
+const out = input.counts.map(function(n) {
+    return window.dash_clientside.metoncofit.heatmaps(n, input.views, 1, null, '');
+});
+console.log(JSON.stringify(out));
+"""
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs node')
+def test_client_slice_order(partitions):
+    directions = ['up', 'neut', 'down']
+    for view, parts in sorted(partitions.items()):
+        # The heatmap-store data of run_app's 'client' slider mode
+        views = {}
+        for nam, part in parts.items():
+            matrix = part.ranked()
+            views[nam] = {'figure': metoncofit.figures.heatmap(matrix, validated=False),
+                          'rank': matrix['rank'],
+                          'position': matrix['position']}
+        body = metoncofit.cache.to_json({'views': views, 'counts': COUNTS})
+        out = subprocess.run(
+            ['node', '-e', SLICE, os.path.join(ROOT, 'assets', 'metoncofit.js')],
+            input=body, stdout=subprocess.PIPE, check=True).stdout
+        for n, figures in zip(COUNTS, json.loads(out.decode('utf-8'))):
+            for nam, figure in zip(directions, figures):
+                if nam not in parts:
+                    assert figure['data'] == []
+                    continue
+                want = parts[nam].matrix(n)
+                trace = figure['data'][0]
+                assert trace['x'] == list(want['x'])
+                assert trace['y'] == list(want['y'])
+                z = np.array(trace['z'], dtype=float)
+                np.testing.assert_allclose(z, want['z'], rtol=1e-6)
+
+
+def test_bin_columns_edges():
+    matrix = {'x': np.array(['G{}'.format(i) for i in range(10)]),
+              'y': np.array(['a']),
+              'z': np.arange(10, dtype=np.float32)[None, :],
+              'customdata': np.zeros((1, 10), dtype=np.float32)}
+    binned = metoncofit.data.bin_columns(matrix, 0, 10, 3)
+    np.testing.assert_array_equal(binned['edges'], [0, 3, 7, 10])
+    assert [list(genes) for genes in binned['genes']] == [
+        ['G0', 'G1', 'G2'], ['G3', 'G4', 'G5', 'G6'], ['G7', 'G8', 'G9']]
+
+    # A window of columns keeps its own edges
+    binned = metoncofit.data.bin_columns(matrix, 4, 9, 2)
+    assert binned['edges'][0] == 4 and binned['edges'][-1] == 9
+    assert sum(len(genes) for genes in binned['genes']) == 5
+
+    # No more runs than columns
+    binned = metoncofit.data.bin_columns(matrix, 2, 5, 10)
+    np.testing.assert_array_equal(binned['edges'], [2, 3, 4, 5])
+    np.testing.assert_array_equal(binned['z'], matrix['z'][:, 2:5])
+
+
+def test_bin_columns_aggregates():
+    nan = np.nan
+    z = np.array([[1, 3, nan, 8],
+                  [nan, nan, 2, nan]], dtype=np.float32)
+    r = np.array([[0.5, -0.5, nan, 1],
+                  [nan, nan, 0.25, nan]], dtype=np.float32)
+    matrix = {'x': np.array(['A', 'B', 'C', 'D']), 'y': np.array(['f', 'g']),
+              'z': z, 'customdata': r}
+
+    binned = metoncofit.data.bin_columns(matrix, 0, 4, 2)
+    np.testing.assert_array_equal(binned['edges'], [0, 2, 4])
+    np.testing.assert_array_equal(binned['z'], [[2, 8], [nan, 2]])
+    np.testing.assert_array_equal(binned['customdata'], [[0, 1], [nan, 0.25]])
+
+    binned = metoncofit.data.bin_columns(matrix, 0, 4, 2, how='max')
+    np.testing.assert_array_equal(binned['z'], [[3, 8], [nan, 2]])
+    np.testing.assert_array_equal(binned['customdata'], [[0, 1], [nan, 0.25]])
+
+
+def test_gene_rows(table, gene_rows):
+    assert len(gene_rows) == len(table)
+    profile = gene_rows.profile('G007')
+    rows = table[table['Gene'] == 'G007']
+    assert profile['gene'] == 'G007'
+    assert np.count_nonzero(~np.isnan(profile['z'])) == len(rows)
+    assert gene_rows.profile('nope') is None
+
+    view = gene_rows.frame(gene_rows.view('Breast', 'Copy Number Variation'))
+    assert len(view) == ((table['Cancer'] == 'Breast')
+                         & (table['Target'] == 'Copy Number Variation')).sum()
+    assert list(view['Gene']) == sorted(view['Gene'])
@@ -0,0 +1,163 @@
+"""
+Tests for the reloads and request pinning of metoncofit.dataset
+@author: Scott Campit
+"""
+
+import time
+
+import flask
+import pytest
+
+import metoncofit.data
+import metoncofit.dataset
+
+from conftest import write_db
+
+
+def test_load(db, table):
+    dataset = metoncofit.dataset.load(db)
+    assert dataset.version == metoncofit.data.data_version(db)
+    assert dataset.summary == metoncofit.data.summary(table)
+    assert len(dataset.gene_rows) == len(table)
+    assert dataset.gene_index.find('g005') == 'G005'
+
+
+def test_reload(db):
+    prepared, swapped = [], []
+    datasets = metoncofit.dataset.Manager(db, prepare=prepared.append,
+                                          swapped=swapped.append)
+    first = datasets.current
+
+    # Unchanged file: nothing is loaded
+    assert datasets.reload() == first.version
+    assert prepared == [] and datasets.current is first
+
+    write_db(db, seed=1)
+    version = datasets.reload()
+    assert version == metoncofit.data.data_version(db) != first.version
+    assert datasets.current is datasets.latest is prepared[0] is swapped[0]
+    assert datasets.current.version == version
+
+    # force loads an unchanged file again
+    assert datasets.reload(force=True) == version
+    assert len(prepared) == 2 and datasets.latest is prepared[1]
+
+
+def test_failed_reload(db):
+    datasets = metoncofit.dataset.Manager(db)
+    first = datasets.current
+    with open(db, 'w') as f:
+        f.write('{not json')
+    with pytest.raises(ValueError):
+        datasets.reload()
+    assert datasets.current is first
+
+
+def test_prepare_sees_new_dataset(db):
+    seen = []
+
+    def prepare(dataset):
+        # Pinned by the caller, e.g. run_app.warm_cache
+        with datasets.pinned(dataset):
+            seen.append(datasets.current)
+        seen.append(datasets.current)
+
+    datasets = metoncofit.dataset.Manager(db, prepare=prepare)
+    first = datasets.current
+    write_db(db, seed=1)
+    datasets.reload()
+    # Still unswapped while it is prepared
+    assert seen[0] is datasets.latest and seen[1] is first
+
+
+def test_pinned(db):
+    datasets = metoncofit.dataset.Manager(db)
+    first = datasets.current
+    with datasets.pinned() as pinned:
+        assert pinned is first
+        write_db(db, seed=1)
+        datasets.reload()
+        assert datasets.current is first
+        assert datasets.latest is not first
+        with datasets.pinned(datasets.latest):
+            assert datasets.current is datasets.latest
+        assert datasets.current is first
+    assert datasets.current is datasets.latest
+
+
+def test_requests_pinned(db):
+    datasets = metoncofit.dataset.Manager(db)
+    server = flask.Flask(__name__)
+    datasets.enable(server)
+
+    @server.route('/version')
+    def version():
+        before = datasets.current.version
+        write_db(db, seed=1)
+        datasets.reload()
+        # The request in flight keeps reading the version it started on
+        return '{} {}'.format(before, datasets.current.version)
+
+    first = datasets.current.version
+    client = server.test_client()
+    assert client.get('/version').data.decode() == '{0} {0}'.format(first)
+    assert datasets.latest.version != first
+    assert client.get('/version').data.decode() == '{0} {0}'.format(
+        datasets.latest.version)
+
+
+def test_reload_endpoint(tmp_path, db):
+    datasets = metoncofit.dataset.Manager(db)
+    server = flask.Flask(__name__)
+    datasets.enable(server, token='secret', marker=str(tmp_path / 'reload'))
+    client = server.test_client()
+
+    assert client.post('/admin/reload').status_code == 403
+    assert client.post('/admin/reload', headers={
+        'Authorization': 'Bearer wrong'}).status_code == 403
+
+    write_db(db, seed=1)
+    response = client.post('/admin/reload?wait=1', headers={
+        'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert response.data.decode().strip() == metoncofit.data.data_version(db)
+    assert datasets.latest.version == metoncofit.data.data_version(db)
+
+
+def test_reload_reaches_every_worker(tmp_path, db, monkeypatch):
+    monkeypatch.setattr(metoncofit.dataset, 'MARKER_INTERVAL', 0.05)
+    marker = str(tmp_path / 'reload')
+    workers = []
+    for _ in range(3):
+        datasets = metoncofit.dataset.Manager(db)
+        server = flask.Flask(__name__)
+        datasets.enable(server, token='secret', marker=marker)
+        server.add_url_rule('/', 'index', lambda: '')
+        client = server.test_client()
+        # The first request starts the watcher
+        client.get('/')
+        workers.append((datasets, client))
+    first = workers[0][0].latest.version
+
+    write_db(db, seed=1)
+    response = workers[0][1].post('/admin/reload?wait=1', headers={
+        'Authorization': 'Bearer secret'})
+    version = response.data.decode().strip()
+    assert version != first
+
+    # The workers that didn't answer follow
+    deadline = time.time() + 10
+    while (any(datasets.latest.version != version for datasets, _ in workers)
+           and time.time() < deadline):
+        time.sleep(0.05)
+    assert [datasets.latest.version for datasets, _ in workers] == [version] * 3
+
+    # Forced reloads are passed on as such
+    loaded = workers[1][0].latest
+    workers[2][1].post('/admin/reload?force=1', headers={
+        'Authorization': 'Bearer secret'})
+    deadline = time.time() + 10
+    while workers[1][0].latest is loaded and time.time() < deadline:
+        time.sleep(0.05)
+    assert workers[1][0].latest is not loaded
+    assert workers[1][0].latest.version == version
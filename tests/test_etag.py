@@ -0,0 +1,75 @@
+"""
+Tests for metoncofit.etag
+@author: Scott Campit
+"""
+
+import flask
+
+import metoncofit.etag
+
+
+def server(version, build):
+    app = flask.Flask(__name__)
+    calls = []
+
+    def layout():
+        calls.append('layout')
+        return 'layout'
+
+    def update():
+        calls.append('update')
+        return 'update'
+    app.add_url_rule('/_dash-layout', 'layout', layout)
+    app.add_url_rule('/_dash-dependencies', 'dependencies', layout)
+    app.add_url_rule('/_dash-update-component', 'update', update,
+                     methods=['POST'])
+    metoncofit.etag.enable(app, lambda: version[0], build=build)
+    return app.test_client(), calls
+
+
+def test_not_modified():
+    version = ['v1']
+    client, calls = server(version, lambda: 'build')
+    response = client.get('/_dash-layout')
+    tag = response.headers['ETag']
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    response = client.get('/_dash-layout', headers={'If-None-Match': tag})
+    assert response.status_code == 304 and response.headers['ETag'] == tag
+    assert calls == ['layout']
+
+    # Other paths, encodings and versions get other tags
+    assert client.get('/_dash-dependencies', headers={
+        'If-None-Match': tag}).status_code == 200
+    assert client.get('/_dash-layout', headers={
+        'If-None-Match': tag, 'Accept-Encoding': 'gzip'}).status_code == 200
+    version[0] = 'v2'
+    assert client.get('/_dash-layout', headers={
+        'If-None-Match': tag}).status_code == 200
+
+
+def test_build_changes_tag():
+    builds = []
+
+    def build():
+        builds.append(1)
+        return 'callbacks'
+    first, _ = server(['v'], build)
+    tag = first.get('/_dash-layout').headers['ETag']
+    first.get('/_dash-dependencies')
+    assert len(builds) == 1
+
+    # The same data served by a new deploy or other settings
+    second, _ = server(['v'], lambda: 'other callbacks')
+    assert second.get('/_dash-layout', headers={
+        'If-None-Match': tag}).status_code == 200
+    same, _ = server(['v'], build)
+    assert same.get('/_dash-layout', headers={
+        'If-None-Match': tag}).status_code == 304
+
+
+def test_posts_untagged():
+    client, _ = server(['v'], None)
+    response = client.post('/_dash-update-component', data=b'{}')
+    assert response.status_code == 200 and 'ETag' not in response.headers
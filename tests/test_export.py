@@ -0,0 +1,97 @@
+"""
+Tests for the streamed downloads of metoncofit.export
+@author: Scott Campit
+"""
+
+import io
+
+import flask
+import numpy as np
+import pandas as pd
+import pytest
+
+import metoncofit.data
+import metoncofit.dataset
+import metoncofit.export
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    # Small chunks, so every download is sent in several
+    monkeypatch.setattr(metoncofit.export, 'CHUNK_ROWS', 100)
+    monkeypatch.setattr(metoncofit.export, 'GENE_BATCH', 4)
+    server = flask.Flask(__name__)
+    metoncofit.export.enable(server, metoncofit.dataset.Manager(db))
+    return server.test_client()
+
+
+def normalized(frame):
+    frame = frame[metoncofit.data.COLUMNS].copy()
+    for col in metoncofit.data.CATEGORIES:
+        frame[col] = frame[col].astype(str)
+    for col in metoncofit.data.MEASURES:
+        frame[col] = frame[col].astype(np.float32)
+    return frame.sort_values(['Gene', 'Cancer', 'Target', 'Feature']).reset_index(drop=True)
+
+
+def test_whole_table_csv(client, table):
+    response = client.get('/export?format=csv')
+    assert response.status_code == 200 and response.is_streamed
+    assert response.headers['Content-Disposition'] == 'attachment; filename=metoncofit.csv'
+    body = response.get_data()
+    # One header, then the rows of every chunk
+    assert body.count(b'Gene,Feature') == 1
+    pd.testing.assert_frame_equal(normalized(pd.read_csv(io.BytesIO(body))),
+                                  normalized(table))
+
+
+def test_whole_table_parquet(client, table):
+    pyarrow = pytest.importorskip('pyarrow.parquet')
+    response = client.get('/export?format=parquet')
+    assert response.status_code == 200 and response.is_streamed
+    body = response.get_data()
+    assert pyarrow.ParquetFile(io.BytesIO(body)).num_row_groups > 1
+    pd.testing.assert_frame_equal(normalized(pd.read_parquet(io.BytesIO(body))),
+                                  normalized(table))
+
+
+def test_view(client, table, partitions):
+    cancer, target = 'Breast', 'Copy Number Variation'
+    got = pd.read_csv(io.BytesIO(client.get(
+        '/export?cancer={}&target={}&genes=3&direction=up&direction=down'
+        .format(cancer, target)).get_data()))
+
+    expected = []
+    for nam in ('up', 'down'):
+        names = set(partitions[(cancer, target)][nam].names[:3])
+        expected.append(table[(table['Cancer'] == cancer)
+                              & (table['Target'] == target)
+                              & table['Type'].isin(metoncofit.data.DIRECTIONS[nam])
+                              & table['Gene'].isin(names)])
+    pd.testing.assert_frame_equal(normalized(got), normalized(pd.concat(expected)))
+
+
+@pytest.mark.parametrize('query, message', [
+    ('format=xls', 'format must be one of'),
+    ('cancer=Breast', 'cancer and target must be given together'),
+    ('cancer=Nope&target=X', 'no data for'),
+    ('cancer=Breast&target=Copy Number Variation&direction=left', 'direction must be'),
+    ('cancer=Breast&target=Copy Number Variation&genes=a', 'genes must be a number'),
+    ('cancer=Breast&target=Copy Number Variation&genes=0', 'genes must be at least 1'),
+    ('cancer=Breast&target=Copy Number Variation&genes=-2', 'genes must be at least 1'),
+    ])
+def test_invalid(client, query, message):
+    response = client.get('/export?' + query)
+    assert response.status_code == 400
+    assert response.get_data(as_text=True).startswith(message)
+
+
+def test_sink():
+    sink = metoncofit.export._Sink()
+    sink.write(b'abc')
+    sink.write(b'de')
+    assert sink.take() == b'abcde' and sink.tell() == 5
+    sink.write(b'f')
+    # tell keeps counting from the start after a take
+    assert sink.take() == b'f' and sink.tell() == 6
+    assert sink.take() == b''
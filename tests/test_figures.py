@@ -0,0 +1,71 @@
+"""
+Tests for the zoom handling of metoncofit.figures
+@author: Scott Campit
+"""
+
+import numpy as np
+
+import metoncofit.data
+import metoncofit.figures
+
+
+def zoom(figure, first, last):
+    """
+    The relayoutData of a zoom from run first to run last of a binned figure, edge to edge.
+    """
+    x = figure['data'][0]['x']
+    return {'xaxis.range[0]': float(x[first]), 'xaxis.range[1]': float(x[last + 1])}
+
+
+def test_x_window_edges():
+    assert metoncofit.figures.x_window({'xaxis.range[0]': -0.5,
+                                        'xaxis.range[1]': 9.5}) == (0, 10)
+    assert metoncofit.figures.x_window({'xaxis.range': [2.4, 4.6]}) == (2, 6)
+    assert metoncofit.figures.x_window({'xaxis.range[0]': -3,
+                                        'xaxis.range[1]': 0.2}) == (0, 1)
+
+
+def test_x_window_unchanged():
+    assert metoncofit.figures.x_window({'xaxis.autorange': True}) is None
+    assert metoncofit.figures.x_window(None) is False
+    assert metoncofit.figures.x_window({'yaxis.range[0]': 1,
+                                        'yaxis.range[1]': 2}) is False
+    assert metoncofit.figures.x_window({'xaxis.range[0]': 5,
+                                        'xaxis.range[1]': 4}) is False
+    assert metoncofit.figures.x_window({'xaxis.range': ['a', 'b']}) is False
+
+
+def test_zoom_round_trip(partitions):
+    part = partitions[('Pan Cancer', 'Differential Expression')]['up']
+    matrix = part.ranked()
+    width = len(matrix['x'])
+    binned = metoncofit.data.bin_columns(matrix, 0, width, 7)
+    figure = metoncofit.figures.binned_heatmap(binned, validated=False)
+    edges = binned['edges']
+
+    # Zooming onto runs 2 to 4 asks for exactly their genes
+    start, stop = metoncofit.figures.x_window(zoom(figure, 2, 4))
+    assert (start, stop) == (edges[2], edges[5])
+    assert list(matrix['x'][start:stop]) == list(np.concatenate(binned['genes'][2:5]))
+
+    # The zoomed figure covers the same columns, so zooming onto all of it
+    # gives back the same window
+    zoomed = metoncofit.data.bin_columns(matrix, start, stop, 7)
+    figure = metoncofit.figures.binned_heatmap(zoomed, validated=False)
+    assert metoncofit.figures.x_window(
+        zoom(figure, 0, len(zoomed['genes']) - 1)) == (start, stop)
+
+
+def test_validated_without_colorscale(partitions, gene_rows):
+    part = partitions[('Pan Cancer', 'Differential Expression')]['up']
+    matrix = part.matrix(10)
+    figures = [metoncofit.figures.heatmap(matrix, validated=True),
+               metoncofit.figures.binned_heatmap(
+                   metoncofit.data.bin_columns(matrix, 0, 10, 3), validated=True),
+               metoncofit.figures.profile(gene_rows.profile('G001'), validated=True)]
+    for figure in figures:
+        assert all('colorscale' not in trace for trace in figure['data'])
+
+    figure = metoncofit.figures.heatmap(matrix, cmap=[[0, '#fff'], [1, '#f00']],
+                                        validated=True)
+    assert figure['data'][0]['colorscale'] == [[0, '#fff'], [1, '#f00']]
@@ -0,0 +1,36 @@
+"""
+Tests for metoncofit.search
+@author: Scott Campit
+"""
+
+import metoncofit.search
+
+NAMES = ['GLS', 'GLS2', 'Gls3', 'GLUD1', 'GAPDH', 'ACLY', 'gls4', 'GLS']
+
+
+def test_suggest():
+    index = metoncofit.search.GeneIndex(NAMES)
+    assert index.suggest('gls') == ['GLS', 'GLS2', 'Gls3', 'gls4']
+    assert index.suggest(' Gl ') == ['GLS', 'GLS2', 'Gls3', 'gls4', 'GLUD1']
+    assert index.suggest('gl', limit=2) == ['GLS', 'GLS2']
+    assert index.suggest('g', limit=100) == ['GAPDH', 'GLS', 'GLS2', 'Gls3',
+                                             'gls4', 'GLUD1']
+    assert index.suggest('glx') == []
+    assert index.suggest('') == []
+    assert index.suggest(None) == []
+
+
+def test_find():
+    index = metoncofit.search.GeneIndex(NAMES)
+    assert index.find('gls3') == 'Gls3'
+    assert index.find(' acly ') == 'ACLY'
+    assert index.find('GL') is None
+    assert index.find('ZZZ') is None
+    assert index.find('') is None
+    assert index.find(None) is None
+
+
+def test_from_partitions(table, partitions):
+    index = metoncofit.search.GeneIndex.from_partitions(partitions)
+    assert set(index.names) == set(table['Gene'].astype(str))
+    assert index.find('g012') == 'G012'
@@ -0,0 +1,96 @@
+"""
+Tests for metoncofit.shared
+@author: Scott Campit
+"""
+
+import fcntl
+import os
+import threading
+import time
+
+import metoncofit.data
+import metoncofit.shared
+
+from conftest import write_db
+
+
+def test_held_versions_kept(tmp_path, db):
+    directory = str(tmp_path / 'shared')
+    loaded, lock = metoncofit.shared.load(db, directory)
+    version = loaded[3]
+    assert version == metoncofit.data.data_version(db)
+    bundle = os.path.join(directory, version)
+
+    # Another process attaching to the same version doesn't export it again
+    again, other = metoncofit.shared.load(db, directory)
+    assert again[3] == version
+
+    lock.close()
+    metoncofit.shared.cleanup(directory)
+    assert os.path.isdir(bundle)
+
+    other.close()
+    metoncofit.shared.cleanup(directory)
+    assert os.listdir(directory) == []
+
+
+def test_old_version_removed(tmp_path, db):
+    directory = str(tmp_path / 'shared')
+    (_, _, _, first), lock = metoncofit.shared.load(db, directory)
+    write_db(db, seed=1)
+    (_, _, _, second), new = metoncofit.shared.load(db, directory)
+    assert first != second
+    assert os.path.isdir(os.path.join(directory, first))
+
+    # Swapped out: removed once its last user lets go
+    lock.close()
+    metoncofit.shared.cleanup(directory)
+    assert not os.path.exists(os.path.join(directory, first))
+    assert os.path.isdir(os.path.join(directory, second))
+    new.close()
+    metoncofit.shared.cleanup(directory)
+    assert os.listdir(directory) == []
+
+
+def test_partial_exports_removed(tmp_path):
+    directory = tmp_path / 'shared'
+    directory.mkdir()
+    stale = directory / '.tmp-abc-x1y2'
+    stale.mkdir()
+    (stale / 'manifest.json').write_text('{}')
+    running = directory / '.tmp-def-z3w4'
+    running.mkdir()
+
+    # An export of def still in progress
+    with metoncofit.shared.hold(str(directory / 'def.export'), fcntl.LOCK_EX):
+        metoncofit.shared.cleanup(str(directory))
+        assert not stale.exists()
+        assert running.exists()
+    metoncofit.shared.cleanup(str(directory))
+    assert os.listdir(str(directory)) == []
+
+
+def test_one_export_at_a_time(tmp_path, db, monkeypatch):
+    load_table = metoncofit.data.load_table
+    exports = []
+
+    def slow_load_table(path):
+        exports.append(path)
+        time.sleep(0.2)
+        return load_table(path)
+    monkeypatch.setattr(metoncofit.data, 'load_table', slow_load_table)
+
+    # Workers seeing a new version at the same time
+    directory = str(tmp_path / 'shared')
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        metoncofit.shared.load(db, directory))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(exports) == 1
+    assert len(results) == 4
+    assert len({loaded[3] for loaded, _ in results}) == 1
+    for _, lock in results:
+        lock.close()